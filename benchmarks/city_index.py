@@ -0,0 +1,88 @@
+"""
+Benchmark of the siege city autocomplete, per keystroke.
+
+Types out city names (and some typos) one keystroke at a time against 10k synthetic cities, comparing
+the old lowercase + substring scan with CityIndex. The index should stay under 1ms per keystroke.
+
+Usage: python -m benchmarks.city_index [cities]
+"""
+import sys
+import time
+import random
+import statistics
+
+from commands.siege import City
+from utils.city_index import CityIndex
+
+
+SYLLABLES = ['mo', 'on', 'fall', 'keep', 'wat', 'ch', 'old', 'fes', 'ti', 'via', 'ochy', 'ro', 'zo', 'ni', 'fort', 'ar', 'gen', 'thal', 'vor', 'eld']
+PREFIXES = ['', '', '', 'Keep ', 'Fort ', 'Citadel of ']
+
+
+def synthetic_cities(count, seed=0):
+    randomiser = random.Random(seed)
+    cities = {}
+
+    while len(cities) < count:
+        word = ''.join(randomiser.choice(SYLLABLES) for _ in range(randomiser.randint(2, 4))).title()
+        name = randomiser.choice(PREFIXES) + word
+        if randomiser.random() < 0.3:
+            name += ' ' + ''.join(randomiser.choice(SYLLABLES) for _ in range(2)).title()
+
+        city_id = name.replace(' ', '').lower()
+        cities[city_id] = City(city_id, name, randomiser.randint(1, 10))
+
+    return cities
+
+
+def old_autocomplete(cities, current):
+    return [city for city in cities.values() if current.lower() in city.name.lower()]
+
+
+def keystrokes(cities, count, seed=1):
+    randomiser = random.Random(seed)
+    names = [city.name for city in cities.values()]
+
+    typed = []
+    while len(typed) < count:
+        name = randomiser.choice(names)
+
+        # Sometimes make a typo
+        if randomiser.random() < 0.2:
+            position = randomiser.randrange(len(name))
+            name = name[:position] + randomiser.choice('aeiou') + name[position + 1:]
+
+        typed.extend(name[:length] for length in range(1, len(name) + 1))
+
+    return typed[:count]
+
+
+def measure(func, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        timings.append(time.perf_counter() - start)
+
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return quantiles[49] * 1000, quantiles[98] * 1000, max(timings) * 1000
+
+
+def main(count=10_000):
+    cities = synthetic_cities(count)
+
+    start = time.perf_counter()
+    index = CityIndex(cities.values())
+    print(f'Built index of {len(index)} cities in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+    queries = keystrokes(cities, 5_000)
+
+    print('{:24s} p50 {:.3f}ms  p99 {:.3f}ms  max {:.3f}ms'.format('old substring scan', *measure(lambda query: old_autocomplete(cities, query), queries)))
+    print('{:24s} p50 {:.3f}ms  p99 {:.3f}ms  max {:.3f}ms'.format('CityIndex.search', *measure(lambda query: index.search(query, limit=25), queries)))
+
+    for query in ['keep', 'watchol', 'wtachold', 'fort arg']:
+        print(f'{query!r:12s} -> {[city.full_name for city in index.search(query, limit=5)]}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
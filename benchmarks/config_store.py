@@ -0,0 +1,48 @@
+"""
+Micro-benchmark of the per-message cost of reading the v1 config.
+
+Compares the old approach (open + json.load on every message) with JsonConfigStore.
+
+Usage: python -m benchmarks.config_store [iterations]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+from utils.config import JsonConfigStore, atomic_write_json
+
+
+def load_every_time(path):
+    with open(path, 'r') as config_file:
+        return json.load(config_file)
+
+
+def bench(name, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:28s} {iterations} calls in {elapsed:.3f}s = {elapsed / iterations * 1e6:8.2f} us/message')
+
+
+def main(iterations=100_000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'v1.json')
+        atomic_write_json(path, {'translation_enabled': True})
+
+        store = JsonConfigStore(path, check_interval=5.0)
+
+        bench('open + json.load', lambda: load_every_time(path)['translation_enabled'], iterations)
+        bench('JsonConfigStore.get', lambda: store.get()['translation_enabled'], iterations)
+
+        # Worst case, where every call is due a stat check
+        store.check_interval = 0
+        store._next_check = 0
+        bench('JsonConfigStore.get (stat)', lambda: store.get()['translation_enabled'], iterations)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,350 @@
+"""
+A local stand-in for the parts of the Discord REST API the bot uses, with Discord style rate limits.
+
+Every route has a rate limit bucket per channel (its "major parameter"). Responses carry the same
+X-RateLimit-* headers as Discord, so discord.py's HTTP client limits itself the way it does in
+production, and requests over a limit get a 429 with Retry-After. Messages, reactions and threads are
+kept in memory. Requests and 429s are counted per route for the load scenarios in benchmarks/rest_load.py.
+
+Point the bot at it with DISCORD_API_BASE=http://127.0.0.1:<port>/api/v10 (see main.py).
+
+Usage: python -m benchmarks.fake_discord [port]
+"""
+import sys
+import json
+import time
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Dict, NamedTuple, Tuple
+from urllib.parse import unquote
+
+from aiohttp import web
+
+
+GUILD_ID = 1_100_000_000_000_000_000
+BOT_USER_ID = 1_100_000_000_000_000_001
+MEMBER_USER_ID = 1_100_000_000_000_000_002
+DISCORD_EPOCH = 1_420_070_400_000
+
+
+class Limit(NamedTuple):
+    requests: int
+    per: float
+
+
+# Roughly Discord's limits for the routes we use, per channel
+LIMITS = {
+    ('POST', '/api/v10/channels/{channel_id}/messages'): Limit(5, 5.0),
+    ('PATCH', '/api/v10/channels/{channel_id}/messages/{message_id}'): Limit(5, 5.0),
+    ('DELETE', '/api/v10/channels/{channel_id}/messages/{message_id}'): Limit(5, 1.0),
+    ('POST', '/api/v10/channels/{channel_id}/messages/bulk-delete'): Limit(1, 1.0),
+    ('PUT', '/api/v10/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me'): Limit(1, 0.25),
+    ('DELETE', '/api/v10/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{user_id}'): Limit(1, 0.25),
+    ('POST', '/api/v10/channels/{channel_id}/messages/{message_id}/threads'): Limit(5, 5.0),
+}
+DEFAULT_LIMIT = Limit(50, 1.0)
+
+
+def timestamp(when: datetime = None) -> str:
+    return (when or datetime.now(timezone.utc)).isoformat()
+
+
+def user_payload(user_id: int, name: str, bot: bool = False) -> dict:
+    return {'id': str(user_id), 'username': name, 'discriminator': '0', 'global_name': name, 'avatar': None, 'bot': bot}
+
+
+def json_response(data, status: int = 200, headers: dict = None) -> web.Response:
+    # discord.py only parses JSON when the content type is exactly application/json, without a charset
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={'Content-Type': 'application/json', **(headers or {})})
+
+
+def not_found(message: str, code: int) -> web.HTTPNotFound:
+    return web.HTTPNotFound(body=json.dumps({'message': message, 'code': code}).encode(), headers={'Content-Type': 'application/json'})
+
+
+class Bucket:
+    def __init__(self, limit: Limit):
+        self.limit = limit
+        self.remaining = limit.requests
+        self.resets_at = 0.0
+
+    def take(self) -> Tuple[bool, float]:
+        """Use up a request, returns whether it's allowed and how long until the bucket resets"""
+        now = time.monotonic()
+        if now >= self.resets_at:
+            self.remaining = self.limit.requests
+            self.resets_at = now + self.limit.per
+
+        reset_after = self.resets_at - now
+        if self.remaining <= 0:
+            return False, reset_after
+
+        self.remaining -= 1
+        return True, reset_after
+
+
+class FakeDiscord:
+    def __init__(self, latency: float = 0.0):
+        # Simulated server side latency of every request
+        self.latency = latency
+
+        self.sequence = count()
+        self.channels: Dict[int, dict] = {}
+        self.messages: Dict[int, Dict[int, dict]] = defaultdict(dict)
+
+        self.buckets: Dict[Tuple[str, str, str], Bucket] = {}
+        self.requests = defaultdict(int)
+        self.rate_limited = defaultdict(int)
+        # When sends, deletes and reaction removals happened, for end to end latencies
+        self.events: Dict[Tuple[str, str], float] = {}
+        self._waiters: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.app = web.Application(middlewares=[self.rate_limit_middleware])
+        self.app.add_routes([
+            web.get('/api/v10/users/@me', self.get_me),
+            web.get('/api/v10/oauth2/applications/@me', self.get_application),
+            web.get('/api/v10/users/{user_id}', self.get_user),
+            web.get('/api/v10/channels/{channel_id}', self.get_channel),
+            web.get('/api/v10/channels/{channel_id}/messages', self.get_messages),
+            web.post('/api/v10/channels/{channel_id}/messages', self.create_message),
+            web.post('/api/v10/channels/{channel_id}/messages/bulk-delete', self.bulk_delete),
+            web.get('/api/v10/channels/{channel_id}/messages/{message_id}', self.get_message),
+            web.patch('/api/v10/channels/{channel_id}/messages/{message_id}', self.edit_message),
+            web.delete('/api/v10/channels/{channel_id}/messages/{message_id}', self.delete_message),
+            web.put('/api/v10/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me', self.add_reaction),
+            web.delete('/api/v10/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{user_id}', self.remove_reaction),
+            web.post('/api/v10/channels/{channel_id}/messages/{message_id}/threads', self.create_thread),
+        ])
+
+        self._runner = None
+        self.base_url = None
+
+    # -----------------------
+    # Server
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{port}/api/v10'
+
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def reset_stats(self):
+        self.requests.clear()
+        self.rate_limited.clear()
+
+    def record(self, kind: str, key: str):
+        self.events[kind, key] = time.perf_counter()
+
+        waiter = self._waiters.pop((kind, key), None)
+        if waiter and not waiter.done():
+            waiter.set_result(None)
+
+    async def wait_for(self, kind: str, key: str, timeout: float = 60.0) -> float:
+        """Wait for something to happen, returns when it happened (time.perf_counter)"""
+        if (kind, key) not in self.events:
+            waiter = self._waiters.get((kind, key))
+            if waiter is None:
+                waiter = self._waiters[kind, key] = asyncio.get_running_loop().create_future()
+
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+
+        return self.events[kind, key]
+
+    @web.middleware
+    async def rate_limit_middleware(self, request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        route_key = f'{request.method} {route}'
+        self.requests[route_key] += 1
+
+        limit = LIMITS.get((request.method, route), DEFAULT_LIMIT)
+        channel_id = request.match_info.get('channel_id', '')
+        bucket = self.buckets.get((request.method, route, channel_id))
+        if bucket is None:
+            bucket = self.buckets[request.method, route, channel_id] = Bucket(limit)
+
+        allowed, reset_after = bucket.take()
+        headers = {
+            'X-RateLimit-Limit': str(limit.requests),
+            'X-RateLimit-Remaining': str(max(bucket.remaining, 0)),
+            'X-RateLimit-Reset': f'{time.time() + reset_after:.3f}',
+            'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+            'X-RateLimit-Bucket': f'{abs(hash(route_key)):x}',
+        }
+
+        if not allowed:
+            self.rate_limited[route_key] += 1
+            headers.update({'Retry-After': f'{reset_after:.3f}', 'X-RateLimit-Scope': 'user', 'Via': '1.1 fake-discord'})
+            return json_response({'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False}, status=429, headers=headers)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        response = await handler(request)
+        response.headers.update(headers)
+
+        return response
+
+    # -----------------------
+    # State
+
+    def snowflake(self, when: datetime = None) -> str:
+        """An ID for something created at `when`, discord.py reads creation times (e.g. of messages) from these"""
+        milliseconds = int((when or datetime.now(timezone.utc)).timestamp() * 1000) - DISCORD_EPOCH
+        return str(milliseconds << 22 | next(self.sequence) % (1 << 22))
+
+    def add_channel(self, name: str) -> dict:
+        channel = {
+            'id': self.snowflake(), 'type': 0, 'guild_id': str(GUILD_ID), 'name': name, 'position': len(self.channels),
+            'permission_overwrites': [], 'nsfw': False, 'parent_id': None, 'topic': None, 'last_message_id': None, 'rate_limit_per_user': 0,
+        }
+        self.channels[int(channel['id'])] = channel
+
+        return channel
+
+    def add_message(self, channel_id: int, content: str, author_id: int = MEMBER_USER_ID, age: timedelta = timedelta()) -> dict:
+        created = datetime.now(timezone.utc) - age
+        message = {
+            'id': self.snowflake(created), 'channel_id': str(channel_id), 'guild_id': str(GUILD_ID),
+            'author': user_payload(author_id, 'ELKBot' if author_id == BOT_USER_ID else 'member', bot=author_id == BOT_USER_ID),
+            'content': content, 'timestamp': timestamp(created), 'edited_timestamp': None,
+            'tts': False, 'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [], 'embeds': [],
+            'pinned': False, 'type': 0, 'flags': 0, 'reactions': [],
+        }
+        self.messages[channel_id][int(message['id'])] = message
+
+        return message
+
+    def _message(self, request: web.Request) -> dict:
+        message = self.messages[int(request.match_info['channel_id'])].get(int(request.match_info['message_id']))
+        if message is None:
+            raise not_found('Unknown Message', 10008)
+
+        return message
+
+    # -----------------------
+    # Routes
+
+    async def get_me(self, request):
+        return json_response(user_payload(BOT_USER_ID, 'ELKBot', bot=True))
+
+    async def get_application(self, request):
+        return json_response({
+            'id': str(BOT_USER_ID), 'name': 'ELKBot', 'description': '', 'icon': None, 'bot_public': False, 'bot_require_code_grant': False,
+            'owner': user_payload(MEMBER_USER_ID, 'owner'), 'verify_key': '', 'flags': 0,
+        })
+
+    async def get_user(self, request):
+        return json_response(user_payload(int(request.match_info['user_id']), 'member'))
+
+    async def get_channel(self, request):
+        channel = self.channels.get(int(request.match_info['channel_id']))
+        if channel is None:
+            raise not_found('Unknown Channel', 10003)
+
+        return json_response(channel)
+
+    async def get_messages(self, request):
+        messages = sorted(self.messages[int(request.match_info['channel_id'])].values(), key=lambda message: int(message['id']), reverse=True)
+        limit = int(request.query.get('limit', 50))
+
+        if 'before' in request.query:
+            messages = [message for message in messages if int(message['id']) < int(request.query['before'])]
+        if 'after' in request.query:
+            messages = [message for message in messages if int(message['id']) > int(request.query['after'])][-limit:]
+
+        return json_response(messages[:limit])
+
+    async def create_message(self, request):
+        if request.content_type == 'application/json':
+            data = await request.json()
+        else:
+            # Multipart (e.g. with files), the JSON part is payload_json
+            data = {}
+            async for part in await request.multipart():
+                if part.name == 'payload_json':
+                    data = json.loads(await part.text())
+
+        message = self.add_message(int(request.match_info['channel_id']), data.get('content') or '', author_id=BOT_USER_ID)
+        self.record('send', message['id'])
+
+        return json_response(message)
+
+    async def get_message(self, request):
+        return json_response(self._message(request))
+
+    async def edit_message(self, request):
+        message = self._message(request)
+        data = await request.json()
+
+        if 'content' in data:
+            message['content'] = data['content']
+        message['edited_timestamp'] = timestamp()
+
+        return json_response(message)
+
+    async def delete_message(self, request):
+        self._message(request)
+        del self.messages[int(request.match_info['channel_id'])][int(request.match_info['message_id'])]
+        self.record('delete', request.match_info['message_id'])
+
+        return web.Response(status=204)
+
+    async def bulk_delete(self, request):
+        data = await request.json()
+        channel_messages = self.messages[int(request.match_info['channel_id'])]
+
+        for message_id in data['messages']:
+            channel_messages.pop(int(message_id), None)
+            self.record('delete', str(message_id))
+
+        return web.Response(status=204)
+
+    async def add_reaction(self, request):
+        message = self._message(request)
+        message['reactions'].append({'emoji': {'id': None, 'name': unquote(request.match_info['emoji'])}, 'count': 1, 'me': True})
+
+        return web.Response(status=204)
+
+    async def remove_reaction(self, request):
+        self._message(request)
+        self.record('remove_reaction', f"{request.match_info['message_id']}:{unquote(request.match_info['emoji'])}:{request.match_info['user_id']}")
+
+        return web.Response(status=204)
+
+    async def create_thread(self, request):
+        message = self._message(request)
+        data = await request.json()
+
+        thread = {
+            'id': message['id'], 'type': 11, 'guild_id': str(GUILD_ID), 'parent_id': message['channel_id'], 'name': data.get('name', 'thread'),
+            'owner_id': str(BOT_USER_ID), 'member_count': 1, 'message_count': 0, 'rate_limit_per_user': 0, 'last_message_id': None,
+            'thread_metadata': {'archived': False, 'auto_archive_duration': data.get('auto_archive_duration', 1440), 'archive_timestamp': timestamp(), 'locked': False},
+        }
+        self.channels[int(thread['id'])] = thread
+
+        return json_response(thread)
+
+
+async def serve(port: int):
+    server = FakeDiscord()
+    base_url = await server.start(port=port)
+    channel = server.add_channel('bot-channel')
+
+    print(f'Fake Discord API at {base_url}, bot channel {channel["id"]} (any token works)')
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8089))
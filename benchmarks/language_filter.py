@@ -0,0 +1,110 @@
+"""
+Benchmark of the auto translate pre-filter and langdetect over a message corpus.
+
+Reports the fraction of messages short-circuited by the pre-filter (and why), plus p50/p99 time of the
+filter and of a full langdetect detection, with profiles warmed up first.
+
+The corpus is a JSON lines file of {"content": "...", "roles": ["fr", ...]}, a synthetic corpus is used
+if none is given.
+
+Usage: python -m benchmarks.language_filter [corpus.jsonl]
+"""
+import sys
+import json
+import time
+import random
+import statistics
+from collections import Counter
+
+from utils.language_filter import language_roles, skip_reason
+
+
+SYNTHETIC_MESSAGES = [
+    'ok',
+    'gg everyone, nice siege',
+    'is anyone going to be on for the siege at 8?',
+    'I will be there in 5 minutes, just need to finish this',
+    'https://discord.com/channels/1182139977937723533/1182162116308897844',
+    '<:elk:1182141732079542283> <:elk:1182141732079542283> :fire: :fire:',
+    'what time is it for you? it is 9pm here',
+    'Je serai là pour le siège de ce soir, mais un peu en retard',
+    'Ich kann heute nicht, viel Glück euch allen',
+    'No puedo estar mañana, lo siento mucho chicos',
+    'Qualcuno può aiutarmi con la missione di livello 7?',
+    'merci à tous pour hier soir, super boulot',
+    'can you send me the link to the city please',
+    'Lvl 5 Watchold\n8:00 pm 12/04',
+    'thanks! that was really helpful, see you all later',
+]
+
+SYNTHETIC_ROLES = [[], [], ['Member'], ['Member', 'fr'], ['Member', 'de'], ['es', 'Member', 'Server 01'], ['it']]
+
+
+def synthetic_corpus(size=10_000, seed=0):
+    randomiser = random.Random(seed)
+    return [
+        {'content': randomiser.choice(SYNTHETIC_MESSAGES), 'roles': randomiser.choice(SYNTHETIC_ROLES)}
+        for _ in range(size)
+    ]
+
+
+def load_corpus(path):
+    with open(path, 'r') as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        return samples[0] if samples else 0, samples[0] if samples else 0
+
+    quantiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return quantiles[49], quantiles[98]
+
+
+def main(corpus):
+    from langdetect import detect, DetectorFactory, LangDetectException
+    from langdetect.detector_factory import init_factory
+
+    DetectorFactory.seed = 0
+
+    start = time.perf_counter()
+    init_factory()
+    print(f'Warm up (profile load): {(time.perf_counter() - start) * 1000:.1f}ms')
+
+    reasons = Counter()
+    filter_times = []
+    detect_times = []
+
+    for message in corpus:
+        start = time.perf_counter()
+        reason = skip_reason(message['content'], language_roles(message.get('roles', [])))
+        filter_times.append(time.perf_counter() - start)
+
+        reasons[reason or 'detected'] += 1
+
+        start = time.perf_counter()
+        try:
+            detect(message['content'])
+        except LangDetectException:
+            pass
+        detect_times.append(time.perf_counter() - start)
+
+    total = len(corpus)
+    skipped = total - reasons['detected']
+
+    print(f'{total} messages, {skipped} short-circuited ({skipped / total:.1%})')
+    for reason, count in reasons.most_common():
+        print(f'\t{reason:20s} {count:6d} ({count / total:.1%})')
+
+    filter_p50, filter_p99 = percentiles(filter_times)
+    detect_p50, detect_p99 = percentiles(detect_times)
+    print(f'Pre-filter  p50 {filter_p50 * 1e6:8.1f}us  p99 {filter_p99 * 1e6:8.1f}us')
+    print(f'langdetect  p50 {detect_p50 * 1e6:8.1f}us  p99 {detect_p99 * 1e6:8.1f}us')
+
+    before = sum(detect_times)
+    after = sum(filter_times) + sum(t for t, message in zip(detect_times, corpus) if not skip_reason(message['content'], language_roles(message.get('roles', []))))
+    print(f'Total detection time {before:.2f}s before, {after:.2f}s after')
+
+
+if __name__ == '__main__':
+    main(load_corpus(sys.argv[1]) if len(sys.argv) > 1 else synthetic_corpus())
@@ -0,0 +1,91 @@
+"""
+Benchmark of how long logging stalls the event loop, writing to a rotating file directly vs through the queue.
+
+A ticker task measures how late each of its 1ms sleeps wakes up while other tasks log bursts of debug
+lines (with the odd exception), the same way the bot's handlers log from the event loop.
+
+Usage: python -m benchmarks.logging_stall [lines]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import logging.handlers
+import tempfile
+import statistics
+
+from utils.log import setup_logging
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def producer(logger, lines, burst=200):
+    for number in range(0, lines, burst):
+        for offset in range(burst):
+            logger.debug(f'Guild available: Elements Kingdom ({number + offset}) with a reasonably long debug line')
+
+        try:
+            raise ValueError('example')
+        except ValueError:
+            logger.exception('Something went wrong')
+
+        await asyncio.sleep(0)
+
+
+async def run(logger, lines):
+    lags = []
+    stop = asyncio.Event()
+    ticking = asyncio.create_task(ticker(lags, stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(logger, lines // 4) for _ in range(4)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticking
+
+    return elapsed, lags
+
+
+def report(name, elapsed, lags):
+    # Inclusive quantiles stay within the samples, the default extrapolates past the max of a small sample
+    quantiles = statistics.quantiles(lags, n=100, method='inclusive')
+    print(f'{name:12s} loop busy {elapsed * 1000:7.1f}ms  stall p50 {quantiles[49] * 1000:.3f}ms  p99 {quantiles[98] * 1000:.3f}ms  max {max(lags) * 1000:.3f}ms')
+
+
+def main(lines=20_000):
+    directory = tempfile.mkdtemp()
+
+    # Small files so both runs include rotations
+    direct_logger = logging.getLogger('benchmark.direct')
+    direct_logger.propagate = False
+    direct_logger.setLevel(logging.DEBUG)
+    direct_handler = logging.handlers.RotatingFileHandler(os.path.join(directory, 'direct.log'), maxBytes=1_000_000, backupCount=2)
+    direct_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    direct_logger.addHandler(direct_handler)
+
+    report('direct', *asyncio.run(run(direct_logger, lines)))
+    direct_handler.close()
+
+    for json_lines in (False, True):
+        queued_logger = logging.getLogger(f'benchmark.queued.{json_lines}')
+        queued_logger.propagate = False
+        queued_logger.setLevel(logging.DEBUG)
+        queued_handler = logging.handlers.RotatingFileHandler(os.path.join(directory, f'queued-{json_lines}.log'), maxBytes=1_000_000, backupCount=2)
+        listener = setup_logging(queued_logger, queued_handler, json_lines=json_lines)
+
+        report('queued json' if json_lines else 'queued', *asyncio.run(run(queued_logger, lines)))
+
+        start = time.perf_counter()
+        listener.stop()
+        print(f'{"":12s} listener drained in {(time.perf_counter() - start) * 1000:.1f}ms after the loop finished')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
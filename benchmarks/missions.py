@@ -0,0 +1,112 @@
+"""
+Benchmark of mission post parsing and the `Server NN` role lookup in -missions channels.
+
+Compares the old inline regexes + linear `discord.utils.get` role scan with the precompiled parser and
+RoleIndex, over synthetic mission posts and a guild with a realistic number of roles.
+
+Usage: python -m benchmarks.missions [posts] [roles]
+"""
+import re
+import sys
+import time
+import random
+from datetime import datetime
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+import discord.utils
+
+from utils.missions import parse_mission_channel, parse_mission_post
+from utils.roles import RoleIndex
+
+
+class FakeGuild(NamedTuple):
+    id: int
+    roles: list
+
+
+class FakeRole(NamedTuple):
+    id: int
+    name: str
+    guild: FakeGuild = None
+
+
+def synthetic_posts(count, seed=0):
+    randomiser = random.Random(seed)
+    cities = ['Watchold', 'Moonfall Keep', 'Keep Festivia', 'Momofort', 'Ochyro Zoni']
+
+    posts = []
+    for _ in range(count):
+        channel = f's{randomiser.randint(1, 40):02d}-missions'
+        if randomiser.random() < 0.8:
+            hour = randomiser.randint(1, 12)
+            content = f'Lvl {randomiser.randint(1, 10)} {randomiser.choice(cities)}\n{hour}:{randomiser.choice(["00", "30"])} {randomiser.choice(["am", "pm", "PM"])} {randomiser.randint(1, 28):02d}/{randomiser.randint(1, 12):02d}'
+        else:
+            content = 'anyone free for a siege later tonight?'
+        posts.append((channel, content))
+
+    return posts
+
+
+def old_parse(guild, channel_name, content):
+    channel_match = re.search(r's(\d{2})-missions', channel_name)
+    match = re.match(r'^Lvl (\d+) (.+)\n(\d{1,2}:\d{2} [apAP][mM]) (\d{2}/\d{2})', content)
+
+    role_id = None
+    if channel_match:
+        role = discord.utils.get(guild.roles, name=f'Server {channel_match.group(1)}')
+        if role:
+            role_id = role.id
+
+    if match:
+        level, title, time_str, date_str = match.groups()
+        event_time = datetime.strptime(f'{date_str}/{datetime.now().year} {time_str}', '%d/%m/%Y %I:%M %p')
+        event_time = event_time.replace(tzinfo=ZoneInfo('UTC'))
+        return int(event_time.timestamp()), role_id
+
+
+def new_parse(index, guild, channel_name, content):
+    mission = parse_mission_post(content)
+    if mission:
+        role_number = parse_mission_channel(channel_name)
+        role = index.get(guild, f'Server {role_number}') if role_number else None
+        return mission.unix_time, role.id if role else None
+
+
+def main(post_count=20_000, role_count=250):
+    roles = [FakeRole(i, f'Role {i}') for i in range(role_count - 40)]
+    roles += [FakeRole(10_000 + i, f'Server {i:02d}') for i in range(1, 41)]
+    guild = FakeGuild(1, roles)
+
+    posts = synthetic_posts(post_count)
+    index = RoleIndex()
+
+    start = time.perf_counter()
+    old = [old_parse(guild, channel, content) for channel, content in posts]
+    old_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = [new_parse(index, guild, channel, content) for channel, content in posts]
+    new_elapsed = time.perf_counter() - start
+
+    assert old == new, 'Parsers disagree'
+
+    print(f'{post_count} posts, {role_count} roles')
+    print(f'old (inline regex + role scan)  {old_elapsed:.3f}s  {old_elapsed / post_count * 1e6:7.2f}us/post')
+    print(f'new (parser + RoleIndex)        {new_elapsed:.3f}s  {new_elapsed / post_count * 1e6:7.2f}us/post')
+
+    start = time.perf_counter()
+    for _ in range(post_count):
+        discord.utils.get(guild.roles, name='Server 40')
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(post_count):
+        index.get(guild, 'Server 40')
+    indexed = time.perf_counter() - start
+
+    print(f'role lookup: scan {scan / post_count * 1e6:.2f}us, index {indexed / post_count * 1e6:.2f}us')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
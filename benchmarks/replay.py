@@ -0,0 +1,383 @@
+"""
+Offline replay of messages and reactions through the bot's real handlers, without a live guild.
+
+A corpus of events (synthetic, or recorded as JSON lines) is replayed through ELKBot with the legacy and
+siege extensions loaded, so on_message, on_reaction_add and ELKBot.global_check all run for real. Only
+Discord itself (messages, channels, members, ...) is faked, and the translator is stubbed (language
+detection still runs langdetect). Reports messages/sec, latency percentiles for each branch and peak
+memory, and can write them to a JSON file to compare against a previous run.
+
+Corpus lines look like:
+    {"type": "message", "channel": "general", "content": "hello", "roles": ["fr"]}
+    {"type": "reaction", "message": 3, "emoji": "🇫🇷"}   (message is the index of an earlier event)
+
+Usage: python -m benchmarks.replay [--events N] [--corpus corpus.jsonl] [--output result.json] [--compare old.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+import shutil
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import count
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import discord
+from discord.ext import commands
+
+
+# -----------------------
+# Fake Discord objects
+
+snowflakes = count(1_200_000_000_000_000_000)
+
+
+class FakeRole:
+    def __init__(self, guild, name, role_id=None):
+        self.guild = guild
+        self.id = role_id or next(snowflakes)
+        self.name = name
+        self.mention = f'<@&{self.id}>'
+
+
+class FakeGuild:
+    def __init__(self, guild_id=1):
+        self.id = guild_id
+        self.name = 'Replay Guild'
+        self.roles = []
+        self.filesize_limit = 25 * 1024 * 1024
+
+
+class FakeMember:
+    def __init__(self, guild, name, roles=(), bot=False):
+        self.guild = guild
+        self.id = next(snowflakes)
+        self.name = name
+        self.display_name = name
+        self.roles = list(roles)
+        self.bot = bot
+        self.mention = f'<@{self.id}>'
+
+
+class FakeTextChannel(discord.TextChannel):
+    """Passes the isinstance checks of the legacy commands, without any of the connection state"""
+
+    def __init__(self, guild, name):
+        self.guild = guild
+        self.id = next(snowflakes)
+        self.name = name
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        return FakeMessage(self, BOT_MEMBER, content or '')
+
+    async def delete_messages(self, messages, **kwargs):
+        pass
+
+
+class FakeThread:
+    def __init__(self, name):
+        self.name = name
+
+    async def send(self, content=None, **kwargs):
+        return None
+
+
+class FakeMessage:
+    # Read by commands.Context, which only needs it to send for real
+    _state = None
+
+    def __init__(self, channel, author, content):
+        self.id = next(snowflakes)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.reactions = []
+        self.attachments = []
+        self.created_at = datetime.now(timezone.utc)
+        self.jump_url = f'https://discord.com/channels/{channel.guild.id}/{channel.id}/{self.id}'
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+
+    async def delete(self, delay=None):
+        pass
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def create_thread(self, name, **kwargs):
+        return FakeThread(name)
+
+
+class FakeReaction:
+    def __init__(self, message, emoji):
+        self.message = message
+        self.emoji = emoji
+        self.removed = asyncio.Event()
+
+    async def remove(self, user):
+        self.removed.set()
+
+
+# Set once the bot is created
+BOT_MEMBER = None
+
+
+# -----------------------
+# Corpus
+
+CHAT = [
+    'gg everyone, nice siege', 'who is online for the gate later?', 'lol', 'https://example.com/build-guide',
+    'need 2 more for the citadel', 'ok', 'I will be there in 5 minutes', 'what level is watchold?',
+]
+MULTILINGUAL = [
+    ('fr', 'Bonjour à tous, on attaque la forteresse ce soir après le dîner'),
+    ('de', 'Ich komme heute Abend etwas später zur Belagerung, wartet bitte auf mich'),
+    ('es', 'Hola a todos, necesitamos más tropas para defender la ciudad mañana'),
+    ('pt', 'Alguém pode me ajudar com os recursos para a próxima missão de hoje'),
+    ('it', 'Ciao ragazzi, stasera non riesco a partecipare alla missione del castello'),
+]
+MISSIONS = ['Lvl 5 Watchold\n8:00 pm 12/04', 'Lvl 7 Keep Festivia\n9:30 pm 14/05', 'Lvl 3 Moonfall Keep\n7:15 am 02/06']
+COMMANDS = ['!translationstats', '!ano The siege starts at 8pm', '!ano help']
+FLAGS = ['🇫🇷', '🇩🇪', '🇪🇸', '🇬🇧', '🇵🇹']
+
+
+def synthetic_corpus(events, seed=0):
+    randomiser = random.Random(seed)
+    corpus = []
+
+    while len(corpus) < events:
+        kind = randomiser.choices(['chat', 'multilingual', 'mission', 'command', 'reaction'], weights=[50, 20, 5, 10, 15])[0]
+
+        if kind == 'chat':
+            corpus.append({'type': 'message', 'channel': 'general', 'content': randomiser.choice(CHAT), 'roles': []})
+        elif kind == 'multilingual':
+            lang, content = randomiser.choice(MULTILINGUAL)
+            corpus.append({'type': 'message', 'channel': 'general', 'content': content, 'roles': [lang]})
+        elif kind == 'mission':
+            corpus.append({'type': 'message', 'channel': 's01-missions', 'content': randomiser.choice(MISSIONS), 'roles': []})
+        elif kind == 'command':
+            corpus.append({'type': 'message', 'channel': 'bot-commands', 'content': randomiser.choice(COMMANDS), 'roles': ['ELK Bot Testing']})
+        else:
+            # React to an earlier chat message
+            targets = [index for index, event in enumerate(corpus) if event['type'] == 'message' and event['channel'] == 'general']
+            if targets:
+                corpus.append({'type': 'reaction', 'message': randomiser.choice(targets[-50:]), 'emoji': randomiser.choice(FLAGS)})
+
+    return corpus
+
+
+def load_corpus(path):
+    with open(path, 'r') as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def branch(event):
+    """Which path through the handlers an event exercises"""
+    if event['type'] == 'reaction':
+        return 'flag_reaction'
+    if event['content'].startswith('!'):
+        return 'command'
+    if event['channel'].endswith('-missions'):
+        return 'mission'
+    return 'multilingual' if event.get('roles') else 'chat'
+
+
+# -----------------------
+# Replay
+
+def create_bot():
+    import main
+
+    class ReplayContext(commands.Context):
+        # The real ones send through the HTTP client, ours go to the fake channel
+        async def send(self, content=None, **kwargs):
+            return await self.channel.send(content, **kwargs)
+
+        async def reply(self, content=None, **kwargs):
+            return await self.message.reply(content, **kwargs)
+
+    class ReplayBot(main.ELKBot):
+        async def get_context(self, origin, *, cls=ReplayContext):
+            return await super().get_context(origin, cls=cls)
+
+    intents = discord.Intents.default()
+    intents.message_content = True
+    bot = ReplayBot(command_prefix='!', intents=intents)
+    bot.check(bot.global_check)
+
+    return bot
+
+
+async def replay(corpus, repeat_reply_timeout=5.0):
+    from utils.translation import TranslationCache, TranslationService, GoogleTranslateBackend
+
+    class StubBackend(GoogleTranslateBackend):
+        def translate(self, text, src, dest):
+            return f'[{src}->{dest}] {text}'
+
+    bot = create_bot()
+
+    guild = FakeGuild()
+    # The ELK Bot Testing role is one of the roles allowed to run commands
+    guild.roles = [FakeRole(guild, 'ELK Bot Testing', 1227613947482472510), FakeRole(guild, 'Server 01')]
+    guild.roles += [FakeRole(guild, lang) for lang, _ in MULTILINGUAL]
+    roles = {role.name: role for role in guild.roles}
+    channels = {}
+
+    global BOT_MEMBER
+    BOT_MEMBER = FakeMember(guild, 'ELKBot', bot=True)
+    bot._connection.user = BOT_MEMBER
+
+    await bot.load_extension('commands.siege')
+    await bot.load_extension('commands.v1')
+
+    # Stub out the translator, keeping the real language detection
+    v1 = sys.modules['commands.v1']
+    v1.TRANSLATION.close()
+    v1.TRANSLATION = TranslationService(backend=StubBackend(), cache=TranslationCache(database_path=None))
+    await v1.TRANSLATION.warm_up()
+
+    members = {}
+    messages = {}
+    last_message = None
+    latencies = defaultdict(list)
+
+    start = time.perf_counter()
+    for index, event in enumerate(corpus):
+        if event['type'] == 'message':
+            key = tuple(event.get('roles', ()))
+            if key not in members:
+                members[key] = FakeMember(guild, f'member{len(members)}', roles=[roles[name] for name in key if name in roles])
+
+            channel = channels.get(event['channel'])
+            if channel is None:
+                channel = channels[event['channel']] = FakeTextChannel(guild, event['channel'])
+
+            message = FakeMessage(channel, members[key], event['content'])
+            messages[index] = last_message = message
+
+            event_start = time.perf_counter()
+            await bot.on_message(message)
+        else:
+            message = messages.get(event['message'], last_message)
+            reaction = FakeReaction(message, event['emoji'])
+            user = FakeMember(guild, 'reactor')
+
+            # The reaction is done once the flush has removed it again
+            event_start = time.perf_counter()
+            await bot.on_reaction_add(reaction, user)
+            try:
+                await asyncio.wait_for(reaction.removed.wait(), repeat_reply_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        latencies[branch(event)].append(time.perf_counter() - event_start)
+
+    elapsed = time.perf_counter() - start
+
+    await bot.unload_extension('commands.v1')
+    await bot.unload_extension('commands.siege')
+
+    return elapsed, latencies
+
+
+def summarise(corpus, elapsed, latencies):
+    def percentiles(values):
+        if len(values) < 2:
+            values = values * 2
+        quantiles = statistics.quantiles(values, n=100, method='inclusive')
+        return {'count': len(values), 'p50_ms': quantiles[49] * 1000, 'p95_ms': quantiles[94] * 1000, 'p99_ms': quantiles[98] * 1000}
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    # ru_maxrss is in KiB on Linux
+    return {
+        'commit': commit,
+        'time': datetime.now(timezone.utc).isoformat(),
+        'events': len(corpus),
+        'elapsed_s': elapsed,
+        'events_per_s': len(corpus) / elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'branches': {name: percentiles(values) for name, values in sorted(latencies.items())},
+    }
+
+
+def report(result, previous=None):
+    def change(value, old):
+        if old is None or not old:
+            return ''
+        return f' ({(value - old) / old * 100:+.0f}%)'
+
+    print(f'{result["events"]} events in {result["elapsed_s"]:.2f}s: {result["events_per_s"]:.0f} events/s{change(result["events_per_s"], previous and previous["events_per_s"])}, '
+          f'peak RSS {result["peak_rss_mb"]:.0f}MB')
+
+    for name, stats in result['branches'].items():
+        old = previous['branches'].get(name) if previous else None
+        print(f'  {name:14s} {stats["count"]:6d}  p50 {stats["p50_ms"]:7.3f}ms{change(stats["p50_ms"], old and old["p50_ms"])}  '
+              f'p95 {stats["p95_ms"]:7.3f}ms  p99 {stats["p99_ms"]:7.3f}ms{change(stats["p99_ms"], old and old["p99_ms"])}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay messages and reactions through the bot offline')
+    parser.add_argument('--events', type=int, default=5_000, help='Number of synthetic events to replay')
+    parser.add_argument('--corpus', help='Replay a JSON lines corpus instead of a synthetic one')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Compare against the results of a previous run')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.events)
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as previous_file:
+            previous = json.load(previous_file)
+
+    # Run in a scratch directory with a copy of the config, so logs and databases don't touch the real ones
+    workdir = tempfile.mkdtemp(prefix='elkbot-replay-')
+    shutil.copytree(os.path.join(REPO, 'config'), os.path.join(workdir, 'config'))
+    os.makedirs(os.path.join(workdir, 'logs'))
+    os.chdir(workdir)
+    sys.path.insert(0, REPO)
+
+    os.environ.update({
+        'DEVELOPMENT': 'false',
+        'TRANSLATION_CACHE_PATH': '',
+        'TRANSLATION_REACTION_WINDOW': '0',
+        'LOG_LEVELS': os.getenv('LOG_LEVELS', 'discord=WARNING'),
+        'LOG_CONSOLE': 'false',
+    })
+
+    try:
+        elapsed, latencies = asyncio.run(replay(corpus))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = summarise(corpus, elapsed, latencies)
+    report(result, previous)
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(result, output_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Load scenarios for the bot's Discord REST usage, against the rate limited stand-in in benchmarks/fake_discord.py.
+
+The real ELKBot logs in to the fake API (DISCORD_API_BASE), loads its extensions and then handles bursts
+of work through its real handlers and discord.py's real HTTP client, so rate limit buckets, pre-emptive
+waits and 429 retries all behave the way they do against Discord. The translator is stubbed.
+
+Scenarios:
+    missions      members posting missions in an sNN-missions channel at the same time (on_message)
+    delete        !delete of recent and older than 14 days messages
+    translations  a burst of flag reactions from several members on the same messages (on_reaction_add)
+    sieges        siege announcements posted at the same time (publish_announcement)
+
+For each one it reports end to end latency percentiles, the requests made, the 429s the server returned
+and how often discord.py held a request back because its bucket was exhausted.
+
+Usage: python -m benchmarks.rest_load [--scenario NAME] [--scale N] [--latency SECONDS] [--output result.json]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+import tempfile
+import shutil
+from datetime import timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import discord
+
+from benchmarks.fake_discord import FakeDiscord, MEMBER_USER_ID
+
+
+SCENARIOS = ('missions', 'delete', 'translations', 'sieges')
+FLAGS = ['🇫🇷', '🇩🇪', '🇪🇸', '🇵🇹', '🇮🇹', '🇬🇧']
+MISSIONS = ['Lvl 5 Watchold\n8:00 pm 12/04', 'Lvl 7 Keep Festivia\n9:30 pm 14/05', 'Lvl 3 Moonfall Keep\n7:15 am 02/06']
+
+
+class ThrottleCounter(logging.Handler):
+    """Counts discord.py's rate limit waits, from its own log messages"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.exhausted = 0
+        self.retried = 0
+
+    def emit(self, record):
+        message = record.getMessage()
+        if 'has been exhausted' in message:
+            self.exhausted += 1
+        elif 'We are being rate limited' in message:
+            self.retried += 1
+
+
+# -----------------------
+# Scenarios
+
+def message(bot, channel, payload) -> discord.Message:
+    return discord.Message(state=bot._connection, channel=channel, data=payload)
+
+
+async def missions(bot, server, channel, scale):
+    """Members post missions at the same time, each is reposted with reactions and a thread"""
+    posts = [message(bot, channel, server.add_message(channel.id, MISSIONS[index % len(MISSIONS)])) for index in range(scale)]
+
+    async def post(mission):
+        start = time.perf_counter()
+        await bot.on_message(mission)
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(post(mission) for mission in posts))
+
+
+async def delete(bot, server, channel, scale):
+    """One !delete of `scale` recent messages and a tenth as many older ones, which can't be bulk deleted"""
+    v1 = sys.modules['commands.v1']
+
+    old = max(scale // 10, 1)
+    for index in range(old):
+        server.add_message(channel.id, f'old message {index}', age=timedelta(days=20))
+    for index in range(scale):
+        server.add_message(channel.id, f'message {index}')
+
+    command = message(bot, channel, server.add_message(channel.id, f'!delete {scale + old}'))
+    ctx = await bot.get_context(command)
+    filters = await v1.DeleteFilters.convert(ctx, '')
+
+    start = time.perf_counter()
+    await ctx.invoke(v1.delete_messages, scale + old, filters=filters)
+
+    return [time.perf_counter() - start]
+
+
+async def translations(bot, server, channel, scale):
+    """Several members react with different flags to the same few messages, each reaction is answered and removed"""
+    originals = [
+        message(bot, channel, server.add_message(channel.id, 'Bonjour à tous, on attaque la forteresse ce soir après le dîner'))
+        for _ in range(max(scale // len(FLAGS), 1))
+    ]
+
+    async def react(original, emoji, user_id):
+        reaction = discord.Reaction(message=original, data={'count': 1, 'me': False}, emoji=emoji)
+
+        start = time.perf_counter()
+        await bot.on_reaction_add(reaction, discord.Object(user_id))
+        removed = await server.wait_for('remove_reaction', f'{original.id}:{emoji}:{user_id}')
+
+        return removed - start
+
+    return await asyncio.gather(*(
+        react(originals[index % len(originals)], FLAGS[index % len(FLAGS)], MEMBER_USER_ID + index)
+        for index in range(scale)
+    ))
+
+
+async def sieges(bot, server, channel, scale):
+    """Siege announcements posted at the same time, each with its three reactions"""
+    from utils.announcements import publish_announcement
+
+    async def post(index):
+        start = time.perf_counter()
+        await publish_announcement(channel, f'# Siege {index}\nSiege will start soon', reactions=['✅', '❓', '❌'], name='siege')
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(post(index) for index in range(scale)))
+
+
+# -----------------------
+# Runner
+
+async def run(scenarios, scale, latency):
+    server = FakeDiscord(latency=latency)
+    os.environ['DISCORD_API_BASE'] = await server.start()
+    os.environ['DISCORD_BOT_CHANNEL'] = server.add_channel('bot-channel')['id']
+
+    # Each scenario has its own channel, so their rate limit buckets don't overlap
+    channel_names = {'missions': 's01-missions', 'delete': 'general', 'translations': 'translations', 'sieges': 's02-missions'}
+    channel_ids = {name: int(server.add_channel(channel_name)['id']) for name, channel_name in channel_names.items()}
+
+    import main
+    from utils.translation import TranslationCache, TranslationService, GoogleTranslateBackend
+
+    class StubBackend(GoogleTranslateBackend):
+        def translate(self, text, src, dest):
+            return f'[{src}->{dest}] {text}'
+
+    throttles = ThrottleCounter()
+    logging.getLogger('discord.http').setLevel(logging.DEBUG)
+    logging.getLogger('discord.http').addHandler(throttles)
+
+    bot = main.bot
+    # Runs setup_hook, which loads the extensions
+    await bot.login('fake-token')
+
+    v1 = sys.modules['commands.v1']
+    v1.TRANSLATION.close()
+    v1.TRANSLATION = TranslationService(backend=StubBackend(), cache=TranslationCache(database_path=None))
+    await v1.TRANSLATION.warm_up()
+
+    channels = {name: await bot.fetch_channel(channel_id) for name, channel_id in channel_ids.items()}
+
+    results = {}
+    try:
+        for name in scenarios:
+            server.reset_stats()
+            throttles.exhausted = throttles.retried = 0
+
+            start = time.perf_counter()
+            latencies = await globals()[name](bot, server, channels[name], scale[name])
+            elapsed = time.perf_counter() - start
+
+            results[name] = {
+                'count': len(latencies),
+                'elapsed_s': elapsed,
+                'latency_ms': percentiles(latencies),
+                'requests': sum(server.requests.values()),
+                'rate_limited': sum(server.rate_limited.values()),
+                'throttled': throttles.exhausted,
+                'retried': throttles.retried,
+                'routes': {route: {'requests': count, 'rate_limited': server.rate_limited.get(route, 0)} for route, count in sorted(server.requests.items())},
+            }
+    finally:
+        await bot.close()
+        await server.stop()
+
+    return results
+
+
+def percentiles(values):
+    values = [value * 1000 for value in values]
+    if len(values) < 2:
+        values = values * 2
+    quantiles = statistics.quantiles(values, n=100, method='inclusive')
+
+    return {'p50': quantiles[49], 'p95': quantiles[94], 'p99': quantiles[98], 'max': max(values)}
+
+
+def report(results):
+    for name, result in results.items():
+        latency = result['latency_ms']
+        print(f'{name:13s} {result["count"]:4d} in {result["elapsed_s"]:6.2f}s  p50 {latency["p50"]:8.1f}ms  p95 {latency["p95"]:8.1f}ms  p99 {latency["p99"]:8.1f}ms  '
+              f'{result["requests"]:4d} requests, {result["rate_limited"]} 429s, {result["throttled"]} throttled, {result["retried"]} retried')
+
+        for route, counts in result['routes'].items():
+            print(f'    {route:90s} {counts["requests"]:4d}  {counts["rate_limited"]:3d} 429s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the bot against a local rate limited Discord API')
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append', help='Scenario to run (default all), can be repeated')
+    parser.add_argument('--scale', type=int, default=12, help='Missions, reactions or sieges per scenario (messages for delete are 25x this)')
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated server latency of every request, in seconds')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Run in a scratch directory with a copy of the config, so logs and databases don't touch the real ones
+    workdir = tempfile.mkdtemp(prefix='elkbot-rest-load-')
+    shutil.copytree(os.path.join(REPO, 'config'), os.path.join(workdir, 'config'))
+    os.makedirs(os.path.join(workdir, 'logs'))
+    os.chdir(workdir)
+
+    os.environ.update({
+        'DEVELOPMENT': 'false',
+        'TRANSLATION_CACHE_PATH': '',
+        'TRANSLATION_REACTION_WINDOW': '0.5',
+        'LOG_LEVELS': os.getenv('LOG_LEVELS', 'discord=WARNING'),
+        'LOG_CONSOLE': 'false',
+    })
+
+    scenarios = args.scenario or SCENARIOS
+    scale = {name: args.scale * 25 if name == 'delete' else args.scale for name in scenarios}
+
+    try:
+        results = asyncio.run(run(scenarios, scale, args.latency))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(results)
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
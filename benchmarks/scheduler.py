@@ -0,0 +1,88 @@
+"""
+Checks timer accuracy and idle CPU use of the persistent siege reminder scheduler.
+
+Schedules thousands of synthetic siege reminders over a few seconds, measures how late each one fires,
+then measures CPU time used while idling with thousands of jobs far in the future. Finally restarts the
+scheduler on the same database to check pending jobs are reloaded and overdue ones marked missed.
+
+Fails (exits non-zero) if reminders fire too late, idling uses too much CPU or the restart loses jobs.
+
+Usage: python -m benchmarks.scheduler [jobs]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+import statistics
+
+from utils.database import SQLiteDatabase
+from utils.scheduler import PersistentScheduler
+
+
+# Generous bounds, a regression (e.g. polling, or firing on a coarse timer) is far past them
+MAX_P99_LATENESS = 0.1
+MAX_IDLE_CPU = 0.1
+
+
+async def main(job_count=5000):
+    with tempfile.TemporaryDirectory() as directory:
+        database = SQLiteDatabase(os.path.join(directory, 'siege.db'), schema=PersistentScheduler.schema)
+        try:
+            await run(database, job_count)
+        finally:
+            database.close()
+
+
+async def run(database, job_count):
+
+    lateness = []
+    fired = asyncio.Event()
+
+    async def handler(job):
+        lateness.append(time.time() - job.fire_at)
+        if len(lateness) == job_count:
+            fired.set()
+
+    scheduler = PersistentScheduler(database, handler)
+    await scheduler.start()
+
+    # Accuracy: sieges spread over the next 3 seconds, scheduled in random order
+    now = time.time()
+    randomiser = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(job_count):
+        await scheduler.schedule(now + 1 + randomiser.random() * 2, 'siege_reminder', {'message_id': 1})
+    print(f'Scheduled {job_count} jobs in {time.perf_counter() - start:.2f}s')
+
+    await asyncio.wait_for(fired.wait(), 30)
+    quantiles = statistics.quantiles(lateness, n=100, method='inclusive')
+    print(f'Lateness p50 {quantiles[49] * 1000:.2f}ms  p99 {quantiles[98] * 1000:.2f}ms  max {max(lateness) * 1000:.2f}ms')
+    assert quantiles[98] < MAX_P99_LATENESS, f'Reminders fire too late, p99 {quantiles[98] * 1000:.2f}ms'
+
+    # Idle CPU: thousands of sieges days away
+    for _ in range(job_count):
+        await scheduler.schedule(now + 86400 + randomiser.random() * 86400, 'siege_reminder', {'message_id': 1})
+
+    cpu_start = time.process_time()
+    await asyncio.sleep(3)
+    idle_cpu = time.process_time() - cpu_start
+    print(f'Idle CPU with {len(scheduler)} pending jobs: {idle_cpu * 1000:.1f}ms over 3s')
+    assert idle_cpu < MAX_IDLE_CPU, f'Idling used {idle_cpu * 1000:.1f}ms of CPU'
+
+    # Restart: add one overdue job behind the scheduler's back, it should come back as missed
+    await scheduler.stop()
+    await database.execute("INSERT INTO scheduled_jobs (kind, fire_at, payload) VALUES ('siege_reminder', ?, '{}')", (now - 3600,))
+
+    restarted = PersistentScheduler(database, handler)
+    missed = await restarted.start()
+    print(f'After restart: {len(restarted)} pending jobs reloaded, {len(missed)} missed')
+    await restarted.stop()
+
+    assert len(restarted) == job_count, f'{len(restarted)} of the {job_count} future jobs were reloaded'
+    assert len(missed) == 1, f'{len(missed)} jobs were missed, rather than the overdue one'
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
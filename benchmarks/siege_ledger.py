@@ -0,0 +1,110 @@
+"""
+Load test of the siege participation ledger.
+
+Replays reaction add/remove events (100k by default) for a few months of sieges through
+SiegeLedger.record, the same way the raw reaction listeners do, then times the /siege stats queries.
+Fails (exits non-zero) if the ledger's counts differ from replaying the same events in memory.
+
+Usage: python -m benchmarks.siege_ledger [events]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+import statistics
+
+from utils.database import SQLiteDatabase
+from utils.siege_ledger import SiegeLedger
+
+
+def expected_participation(ledger, events, sieges):
+    """The (siege, member, status) rows the events should leave, worked out in memory"""
+    participation = set()
+
+    for message_id, member_id, emoji, added in events:
+        status = ledger.statuses.get(emoji)
+        if status is None or message_id > sieges:
+            continue
+
+        if added:
+            participation.add((message_id, member_id, status))
+        else:
+            participation.discard((message_id, member_id, status))
+
+    return participation
+
+
+async def main(event_count=100_000, sieges=500, members=300):
+    with tempfile.TemporaryDirectory() as directory:
+        database = SQLiteDatabase(os.path.join(directory, 'siege.db'), schema=SiegeLedger.schema)
+        try:
+            await run(database, event_count, sieges, members)
+        finally:
+            database.close()
+
+
+async def run(database, event_count, sieges, members):
+    ledger = SiegeLedger(database)
+    await ledger.load()
+
+    for siege_id in range(1, sieges + 1):
+        await ledger.add_siege(siege_id, 1, f'Siege {siege_id}')
+
+    randomiser = random.Random(0)
+    emojis = list(ledger.statuses) + ['👍']
+    events = [
+        (randomiser.randint(1, sieges + 50), randomiser.randint(1, members), randomiser.choice(emojis), randomiser.random() > 0.15)
+        for _ in range(event_count)
+    ]
+
+    start = time.perf_counter()
+    for index, (message_id, member_id, emoji, added) in enumerate(events):
+        ledger.record(message_id, member_id, emoji, added)
+
+        # Reaction events arrive over time, give the flush a chance to run like the gateway would
+        if index % 100 == 0:
+            await asyncio.sleep(0)
+
+    await ledger.flush()
+    elapsed = time.perf_counter() - start
+    print(f'Replayed {event_count} events in {elapsed:.2f}s ({event_count / elapsed:,.0f} events/s)')
+
+    rows = await database.execute('SELECT COUNT(*) AS total FROM participation')
+    print(f'{rows[0]["total"]} participation rows')
+
+    expected = expected_participation(ledger, events, sieges)
+    assert rows[0]['total'] == len(expected), f'Expected {len(expected)} participation rows'
+
+    for member_id in (1, members // 2, members):
+        counts = {status: 0 for status in ledger.statuses.values()}
+        for _, member, status in expected:
+            if member == member_id:
+                counts[status] += 1
+        assert await ledger.member_stats(member_id) == counts, f'Wrong siege counts for member {member_id}'
+
+    joined = {}
+    for _, member_id, status in expected:
+        if status == 'joined':
+            joined[member_id] = joined.get(member_id, 0) + 1
+    expected_leaderboard = sorted(joined.items(), key=lambda item: (-item[1], item[0]))[:20]
+    assert await ledger.leaderboard('joined', limit=20) == expected_leaderboard, 'Wrong leaderboard'
+
+    timings = []
+    for _ in range(200):
+        start = time.perf_counter()
+        await ledger.member_stats(randomiser.randint(1, members))
+        timings.append(time.perf_counter() - start)
+    print(f'member_stats  p50 {statistics.median(timings) * 1000:.2f}ms  max {max(timings) * 1000:.2f}ms')
+
+    timings = []
+    for _ in range(50):
+        start = time.perf_counter()
+        await ledger.leaderboard('joined', limit=20)
+        timings.append(time.perf_counter() - start)
+    print(f'leaderboard   p50 {statistics.median(timings) * 1000:.2f}ms  max {max(timings) * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,72 @@
+"""
+Benchmark of finding the cities near a position, the grid index against a linear scan.
+
+Scatters tens of thousands of synthetic cities over the map, checks the grid index finds exactly what
+a scan of every city finds, then times both for random positions and radii.
+
+Usage: python -m benchmarks.spatial [cities]
+"""
+import sys
+import math
+import time
+import random
+import statistics
+
+from commands.siege import City
+from utils.spatial import GridIndex
+
+
+MAP_SIZE = 5000
+
+
+def synthetic_cities(count, seed=0):
+    randomiser = random.Random(seed)
+
+    return [
+        City(f'city{number}', f'City {number}', randomiser.randint(1, 10), coords=(randomiser.randrange(MAP_SIZE), randomiser.randrange(MAP_SIZE)))
+        for number in range(count)
+    ]
+
+
+def linear_within(cities, coords, radius):
+    found = []
+    for city in cities:
+        distance = math.dist(coords, city.coords)
+        if distance <= radius:
+            found.append((distance, city))
+
+    found.sort(key=lambda entry: entry[0])
+    return found
+
+
+def measure(func, queries):
+    timings = []
+    for coords, radius in queries:
+        start = time.perf_counter()
+        func(coords, radius)
+        timings.append(time.perf_counter() - start)
+
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return quantiles[49] * 1000, quantiles[98] * 1000, max(timings) * 1000
+
+
+def main(count=50_000):
+    cities = synthetic_cities(count)
+
+    start = time.perf_counter()
+    index = GridIndex(((city.coords, city) for city in cities), cell_size=100)
+    print(f'Built grid of {len(index)} cities in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+    randomiser = random.Random(1)
+    queries = [((randomiser.randrange(MAP_SIZE), randomiser.randrange(MAP_SIZE)), randomiser.choice([50, 200, 500])) for _ in range(500)]
+
+    for coords, radius in queries[:50]:
+        expected = {city.id for _, city in linear_within(cities, coords, radius)}
+        assert {city.id for _, city in index.within(coords, radius)} == expected, (coords, radius)
+
+    print('{:16s} p50 {:.3f}ms  p99 {:.3f}ms  max {:.3f}ms'.format('linear scan', *measure(lambda coords, radius: linear_within(cities, coords, radius), queries)))
+    print('{:16s} p50 {:.3f}ms  p99 {:.3f}ms  max {:.3f}ms'.format('GridIndex', *measure(index.within, queries)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,110 @@
+"""
+Shows the event loop keeps handling other events while a slow translation is in flight.
+
+A fake backend sleeps for each call, while a ticker coroutine stands in for other gateway events.
+The old inline (synchronous) call freezes the ticker, TranslationService does not. Every text is
+different so the cached runs are reported separately, instead of passing cache hits off as translations.
+
+Fails (exits non-zero) if the ticker stalls while TranslationService translates, or a timeout doesn't fire.
+
+Usage: python -m benchmarks.translation_service
+"""
+import time
+import asyncio
+
+from utils.translation import TranslationService
+
+
+class SlowBackend:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def detect(self, text):
+        time.sleep(self.delay)
+        return 'fr'
+
+    def translate(self, text, src, dest):
+        time.sleep(self.delay)
+        return f'[{src}->{dest}] {text}'
+
+
+async def ticker(stop: asyncio.Event, interval=0.01):
+    """Stand in for other events, returns the number handled and the longest gap between them"""
+    handled = 0
+    longest_gap = 0.0
+    last = time.perf_counter()
+
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        longest_gap = max(longest_gap, now - last)
+        last = now
+        handled += 1
+
+    return handled, longest_gap
+
+
+async def run(name, translate):
+    stop = asyncio.Event()
+    ticks = asyncio.create_task(ticker(stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await translate()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    handled, longest_gap = await ticks
+
+    print(f'{name:28s} translated in {elapsed:.2f}s, {handled:4d} other events handled, longest loop stall {longest_gap * 1000:7.1f}ms')
+
+    return longest_gap
+
+
+async def main():
+    delay = 0.5
+    backend = SlowBackend(delay=delay)
+
+    async def inline():
+        backend.detect('bonjour tout le monde')
+        backend.translate('bonjour tout le monde', 'fr', 'en')
+
+    service = TranslationService(backend, workers=2, timeout=5)
+    texts = (f'bonjour tout le monde {index}' for index in range(100))
+
+    async def offloaded(text=None):
+        text = text or next(texts)
+        lang = await service.detect(text)
+        await service.translate(text, lang, 'en')
+
+    async def concurrent():
+        await asyncio.gather(*(offloaded() for _ in range(4)))
+
+    async def cached():
+        await offloaded('bonjour tout le monde 0')
+
+    # The inline call stalls the loop for the whole backend delay, which shows the ticker can tell
+    assert await run('inline (old)', inline) >= delay, 'Inline translation should stall the loop'
+
+    # Off the loop the ticker keeps going, its longest gap stays far below the backend delay
+    for name, translate in (('TranslationService', offloaded), ('TranslationService x4', concurrent), ('TranslationService (cached)', cached)):
+        longest_gap = await run(name, translate)
+        assert longest_gap < delay / 5, f'{name} stalled the loop for {longest_gap * 1000:.0f}ms'
+
+    timeout_service = TranslationService(SlowBackend(delay=1.0), workers=1, timeout=0.2)
+    start = time.perf_counter()
+    try:
+        await timeout_service.translate('hallo', 'de', 'en')
+    except asyncio.TimeoutError:
+        print(f'{"timeout (0.2s)":28s} gave up after {time.perf_counter() - start:.2f}s')
+    else:
+        raise AssertionError('Translating past the timeout should raise TimeoutError')
+
+    assert time.perf_counter() - start < 1.0, 'The timeout should give up before the backend returns'
+
+    service.close()
+    timeout_service.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,5 +1,5 @@
 import os
-from typing import List, Union
+from typing import List, Literal, Union
 import logging
 import datetime
 from enum import Enum
@@ -189,6 +189,29 @@ class Info(discord.ext.commands.Cog):
 
         await interaction.response.send_message(self.format_info_message('guild', info), ephemeral=True)
 
+    # Stats (command only)
+    @info.command(description='Get how often and how quickly commands and events have run')
+    @discord.app_commands.describe(kind='Only show one kind of handler')
+    async def stats(self, interaction: discord.Interaction, kind: Literal['command', 'app_command', 'event', 'translation'] = None):
+        await self.bot.log_command_to_discord('info.stats', interaction.user, interaction.channel, {'kind': kind})
+
+        info = {
+            'since': datetime.datetime.fromtimestamp(self.bot.metrics.started, datetime.timezone.utc),
+        }
+
+        # Busiest first, as many as fit in a message (names can be long, e.g. nested app commands)
+        message = self.format_info_message('stats', info)
+        for summary in self.bot.metrics.summary(kind)[:20]:
+            name = summary.name if kind else f'{summary.kind} {summary.name}'
+            info[name] = f'{summary.count} ({summary.errors} errors) p50 {summary.p50 * 1000:.0f}ms p95 {summary.p95 * 1000:.0f}ms p99 {summary.p99 * 1000:.0f}ms'
+
+            longer = self.format_info_message('stats', info)
+            if len(longer) > 2000:
+                break
+            message = longer
+
+        await interaction.response.send_message(message, ephemeral=True)
+
 
 async def setup(bot):
     await bot.add_cog(Info(bot=bot))
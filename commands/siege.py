@@ -1,12 +1,20 @@
 import os
+import asyncio
 from typing import List, NamedTuple, Tuple
 import logging
 import datetime
 from enum import Enum
-import json
 import discord
 import discord.ext.commands
 import discord.app_commands
+from utils.announcements import publish_announcement
+from utils.city_index import CityIndex
+from utils.city_store import JsonCityStore, SQLiteCityStore, import_json_once, read_cities_file
+from utils.database import SQLiteDatabase
+from utils.scheduler import Job, PersistentScheduler
+from utils.siege_backfill import BackfillProgress, SiegeBackfill
+from utils.siege_ledger import SiegeLedger
+from utils.spatial import GridIndex, format_coords, parse_coords
 
 
 class City(NamedTuple):
@@ -25,51 +33,145 @@ class City(NamedTuple):
         else:
             return self.name
 
+    @property
+    def coords_text(self):
+        return format_coords(self.coords)
+
+    def to_record(self) -> dict:
+        """As stored, with coords as "x,y" """
+        return {**self._asdict(), 'coords': self.coords_text}
+
 
 class Siege(discord.ext.commands.Cog):
     config_file = f"{os.getcwd()}/config/cities.json"
+    database_file = f"{os.getcwd()}/data/siege.db"
     siege = discord.app_commands.Group(name='siege', description='Manage Sieges')
 
+    # Remind everyone who might be joining a siege this long before it starts
+    reminder_lead_time = datetime.timedelta(minutes=5)
+    reminder_reactions = ("✅", "❓")
+
     def __init__(self, bot):
         self.bot = bot
         self.logger = logging.getLogger(f'discord.elkbot.{__name__}')
 
-        self.cities = self.load_cities()
+        self.cities = {}
+        self.city_index = CityIndex()
+        self.city_grid = GridIndex()
+
+        self.database = SQLiteDatabase(self.database_file, schema=PersistentScheduler.schema + SiegeLedger.schema + SiegeBackfill.schema + SQLiteCityStore.schema)
+
+        # Cities are kept in the siege database, unless CITIES_STORE=json keeps them in cities.json
+        if os.getenv('CITIES_STORE', 'sqlite') == 'json':
+            self.city_store = JsonCityStore(self.config_file)
+        else:
+            self.city_store = SQLiteCityStore(self.database)
+
+        self.scheduler = PersistentScheduler(self.database, self.fire_reminder)
+        self.ledger = SiegeLedger(self.database)
+        self.backfill = SiegeBackfill(self.database, self.ledger)
+        self.backfill_tasks = {}
 
     async def cog_load(self):
+        await self.load_cities()
+
+        # Only reload cities.json when it's where cities are kept, otherwise it's just what was imported the
+        # first time and reloading it would undo the changes made since, so edits to it are only warned about
+        if isinstance(self.city_store, JsonCityStore):
+            self.bot.file_watcher.watch(self.config_file, read_cities_file, self.apply_cities_file)
+        else:
+            self.bot.file_watcher.watch(self.config_file, lambda path: None, self.warn_cities_file_ignored)
+
+        await self.ledger.load()
+        missed = await self.scheduler.start()
+
+        for job in missed:
+            self.bot.queue_log_to_discord(f'Missed siege reminder for {job.payload.get("city")} at <t:{int(job.fire_at)}:F>, the bot was not running')
+
         self.logger.info('Siege cog loaded')
 
     async def cog_unload(self):
-        self.logger.info('Siege cog unloaded')
+        self.bot.file_watcher.unwatch(self.config_file)
 
-    def load_cities(self):
-        """Load cities from list of dicts into dict of NamedTuples"""
-        try:
-            with open(self.config_file, 'r') as cities_config:
-                data = json.load(cities_config)
+        for task in self.backfill_tasks.values():
+            task.cancel()
 
-            return {city['id']:City(**city) for city in data}
-        except FileNotFoundError as e:
-            self.logger.warning('Cities config not found')
-            return []
-        except Exception:
-            self.logger.exception('Could not load cities from config')
-            return []
+        # Reminders being sent are stopped before the database they record their status in is closed
+        await self.scheduler.stop()
+        await self.ledger.flush()
+        self.database.close()
 
-    def save_cities(self):
-        """Save our dict of City NamedTuples as a list of dicts"""
+        self.logger.info('Siege cog unloaded')
+
+    async def load_cities(self):
+        """Load cities from the store (importing cities.json the first time) into dict of NamedTuples"""
         try:
-            with open(self.config_file, 'w') as cities_config:
-                json.dump(list(city._asdict() for city in self.cities.values()), cities_config, indent=4)
+            cities = self.make_cities(await import_json_once(self.city_store, self.config_file))
         except Exception:
-            self.logger.exception('Could not save cities to config')
+            # Still load the cog, just without cities
+            self.logger.exception('Could not load cities')
+            cities = {}
+
+        self.set_cities(cities)
+        self.logger.info(f'Loaded {len(self.cities)} cities')
+
+    async def apply_cities_file(self, data: list):
+        """Take in an edited (and already validated) cities.json of the JSON city store, called by the bot's file watcher"""
+        cities = self.make_cities(await self.city_store.apply_file(data))
+
+        # e.g. the JSON city store saving a change we made ourselves
+        if cities == self.cities:
+            return
+
+        self.set_cities(cities)
+        self.bot.queue_log_to_discord(f'Reloaded cities.json, {len(self.cities)} cities available')
+
+    def warn_cities_file_ignored(self, _):
+        """cities.json was edited while cities are kept in the siege database, called by the bot's file watcher"""
+        self.logger.warning(f'{self.config_file} changed, but cities are kept in the siege database, ignoring it')
+        self.bot.queue_log_to_discord(
+            '`cities.json` was edited, but it is no longer where cities are kept (they are in the siege database since '
+            'they were imported from it). Use `/siege add_city`, `update_city` and `remove_city` to change them.',
+            silent=False,
+        )
+
+    def make_cities(self, data: list) -> dict:
+        """Turn a list of stored dicts into a dict of NamedTuples"""
+        cities = {}
+        for city in data:
+            try:
+                coords = parse_coords(city.get('coords'))
+            except ValueError:
+                self.logger.warning(f'Ignoring invalid coordinates of city {city["id"]}: {city.get("coords")}')
+                coords = None
+
+            cities[city['id']] = City(**{**city, 'coords': coords})
+
+        return cities
+
+    def set_cities(self, cities: dict):
+        """Swap in new cities along with their indexes"""
+        self.cities = cities
+        self.index_cities()
+
+    def index_cities(self):
+        self.city_index.rebuild(self.cities.values())
+        self.city_grid.rebuild((city.coords, city) for city in self.cities.values() if city.coords)
+
+    async def save_city(self, city: City):
+        """Write a single added/changed city to the store, then use it"""
+        # If the write fails we keep using what's stored, rather than a change that would be lost on restart
+        await self.city_store.upsert(city.to_record())
+
+        self.cities[city.id] = city
+        self.index_cities()
 
     def get_city(self, city_id: str) -> dict:
         return self.cities[city_id]
 
     @siege.command(description='Schedule a siege on a city')
-    @discord.app_commands.describe(city='Select the city we are going to siege', day='Pick which day the siege will take place (or enter in format YYYY-MM-DD)', time='Set the start time of the siege, in 24 hour UTC')
-    async def start(self, interaction: discord.Interaction, city: str, day: str, time: str):
+    @discord.app_commands.describe(city='Select the city we are going to siege', day='Pick which day the siege will take place (or enter in format YYYY-MM-DD)', time='Set the start time of the siege, in 24 hour UTC', region='Only suggest cities in this region')
+    async def start(self, interaction: discord.Interaction, city: str, day: str, time: str, region: str = None):
         # Detect wrong channel
         if not interaction.channel.name.endswith('-missions'):
             return await interaction.response.send_message('Sieges must be started in the `s01-missions` channel', ephemeral=True)
@@ -100,7 +202,7 @@ class Siege(discord.ext.commands.Cog):
             "❌": "if you know you won't make it",
         }
 
-        role = discord.utils.get(interaction.guild.roles, name='Server 01')
+        role = self.bot.role_index.get(interaction.guild, 'Server 01')
 
         message_content = f"# {city.full_name}\nSiege will start at <t:{start_time:%s}:F> (that's <t:{start_time:%s}:R>)"
 
@@ -108,7 +210,7 @@ class Siege(discord.ext.commands.Cog):
             link_text = city.name
 
             if city.coords:
-                link_text += f' ({city.coords})'
+                link_text += f' ({city.coords_text})'
 
             message_content += f'\nLink to city in game: [{link_text}]({city.deep_link})'
 
@@ -116,24 +218,72 @@ class Siege(discord.ext.commands.Cog):
         for reaction, reason in reactions.items():
             message_content += f"\n\t{reaction} {reason}"
 
-        first_message = await interaction.channel.send(message_content)
+        # Track the post in the ledger as soon as it's sent, so no reaction is missed while the rest is set up
+        async def track(message: discord.Message):
+            await self.ledger.add_siege(message.id, message.channel.id, city.full_name, int(start_time.timestamp()))
 
-        for reaction in reactions:
-            try:
-                await first_message.add_reaction(reaction)
-            except Exception as e:
-                self.logger.exception('Could not add reaction to siege message: %s', str(e))
+        announcement = await publish_announcement(interaction.channel, message_content, reactions=list(reactions), name='siege', on_sent=track)
+
+        if announcement.errors:
+            self.logger.error(f'Siege post incomplete, failed steps: {", ".join(announcement.errors)}')
+
+        # Schedule the pre-ping for everyone who reacted that they're joining (or might be)
+        reminder_time = start_time - self.reminder_lead_time
+        if reminder_time > datetime.datetime.now(datetime.timezone.utc):
+            await self.scheduler.schedule(reminder_time.timestamp(), 'siege_reminder', {
+                'channel_id': announcement.message.channel.id,
+                'message_id': announcement.message.id,
+                'city': city.full_name,
+                'start_time': int(start_time.timestamp()),
+            })
+
+    async def fire_reminder(self, job: Job):
+        """Ping everyone who reacted ✅ or ❓ to a siege post, collected from the post in one pass"""
+        channel = self.bot.get_channel(job.payload['channel_id']) or await self.bot.fetch_channel(job.payload['channel_id'])
+
+        try:
+            message = await channel.fetch_message(job.payload['message_id'])
+        except discord.NotFound:
+            self.logger.warning(f'Siege post {job.payload["message_id"]} was deleted, skipping reminder')
+            return
+
+        mentions = {}
+        for reaction in message.reactions:
+            if str(reaction.emoji) in self.reminder_reactions:
+                async for user in reaction.users():
+                    if not user.bot:
+                        mentions[user.id] = user.mention
+
+        if not mentions:
+            self.logger.info(f'Nobody to remind for siege of {job.payload["city"]}')
+            return
+
+        content = f"Siege of {job.payload['city']} starts <t:{job.payload['start_time']}:R>!"
+        for mention in mentions.values():
+            if len(content) + len(mention) + 1 > 2000:
+                await message.reply(content)
+                content = ''
+            content += f' {mention}'
+
+        await message.reply(content.strip())
 
     @start.autocomplete('city')
     async def autocomplete_city(self, interaction: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
         try:
             return [
                 discord.app_commands.Choice(name=city.full_name, value=city.id)
-                for city in self.cities.values() if current.lower() in city.name.lower()
+                for city in self.city_index.search(current, limit=25, region=getattr(interaction.namespace, 'region', None))
             ]
         except:
             self.logger.exception('Error autocompleting city for siege')
 
+    @start.autocomplete('region')
+    async def autocomplete_region(self, interaction: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
+        return [
+            discord.app_commands.Choice(name=region, value=region)
+            for region in self.city_index.regions() if current.lower() in region.lower()
+        ][:25]
+
     @start.autocomplete('day')
     async def autocomplete_day(self, interaction: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
         today = datetime.date.today()
@@ -159,6 +309,97 @@ class Siege(discord.ext.commands.Cog):
         else:
             await interaction.response.send_message(f'There was an error scheduling the siege: {error}', ephemeral=True)
 
+    def is_bot(self, payload: discord.RawReactionActionEvent) -> bool:
+        """Whether a reaction is from this bot or another one, which don't count as siege participation"""
+        if payload.user_id == self.bot.user.id:
+            return True
+
+        # Only reaction adds come with the member, fall back to the user cache for removals
+        user = payload.member or self.bot.get_user(payload.user_id)
+        return user is not None and user.bot
+
+    @discord.ext.commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        if not self.is_bot(payload):
+            self.ledger.record(payload.message_id, payload.user_id, str(payload.emoji), added=True)
+
+    @discord.ext.commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        if not self.is_bot(payload):
+            self.ledger.record(payload.message_id, payload.user_id, str(payload.emoji), added=False)
+
+    @siege.command(description='Show how many sieges members have joined')
+    @discord.app_commands.describe(member='Show the siege counts of a single member, rather than the leaderboard')
+    async def stats(self, interaction: discord.Interaction, member: discord.Member = None):
+        await self.bot.log_command_to_discord('siege.stats', interaction.user, interaction.channel, {'member': member.name if member else None})
+
+        if member:
+            counts = await self.ledger.member_stats(member.id)
+            message = f'Sieges for {member.mention}:'
+            for reaction, status in self.ledger.statuses.items():
+                message += f"\n\t{reaction} {status}: {counts[status]}"
+        else:
+            leaderboard = await self.ledger.leaderboard('joined', limit=20)
+            message = 'Members who have joined the most sieges:'
+            for position, (member_id, sieges) in enumerate(leaderboard, start=1):
+                message += f"\n\t{position}. <@{member_id}> {sieges}"
+
+            if not leaderboard:
+                message += '\n\tNobody yet!'
+
+        await interaction.response.send_message(message, ephemeral=True, allowed_mentions=discord.AllowedMentions.none())
+
+    @siege.command(description='Record reactions to siege/mission posts made before we tracked them (admin only)')
+    @discord.app_commands.describe(
+        channel='The missions channel to scan',
+        dry_run='Scan and count without recording anything',
+        from_start='Ignore any checkpoint and scan the whole channel again',
+    )
+    @discord.app_commands.checks.has_permissions(administrator=True)
+    async def backfill(self, interaction: discord.Interaction, channel: discord.TextChannel, dry_run: bool = False, from_start: bool = False):
+        await self.bot.log_command_to_discord('siege.backfill', interaction.user, interaction.channel, {'channel': channel.name, 'dry_run': dry_run, 'from_start': from_start})
+
+        running = self.backfill_tasks.get(channel.id)
+        if running and not running.done():
+            return await interaction.response.send_message(f'A backfill of {channel.mention} is already running', ephemeral=True)
+
+        # A dry run scans from the start too, but leaves the checkpoint for the next real run
+        if from_start and not dry_run:
+            await self.backfill.clear_checkpoint(channel.id)
+
+        await interaction.response.send_message(f'Backfill of {channel.mention} started{" (dry run)" if dry_run else ""}, progress is reported in the bot channel', ephemeral=True)
+
+        task = asyncio.create_task(self._run_backfill(channel, dry_run, from_start))
+        self.backfill_tasks[channel.id] = task
+        task.add_done_callback(lambda _: self.backfill_tasks.pop(channel.id, None))
+
+    async def _run_backfill(self, channel: discord.TextChannel, dry_run: bool, from_start: bool):
+        label = f'Siege backfill of {channel.mention}{" (dry run)" if dry_run else ""}'
+        status_message = await self.bot.log_to_discord(f'{label} starting...')
+        last_update = 0
+
+        def describe(progress: BackfillProgress):
+            resumed = f', resumed after message {progress.resumed_from}' if progress.resumed_from else ''
+            return f'{progress.scanned} messages scanned ({progress.rate:.0f}/s), {progress.found} posts found, {progress.reactions} reactions{resumed}'
+
+        async def on_progress(progress: BackfillProgress):
+            nonlocal last_update
+
+            # Don't spend our rate limit on progress updates
+            if status_message and progress.elapsed - last_update > 5:
+                last_update = progress.elapsed
+                await status_message.edit(content=f'{label}: {describe(progress)}...')
+
+        try:
+            progress = await self.backfill.run(channel, self.bot.user.id, dry_run=dry_run, from_start=from_start, on_progress=on_progress)
+        except Exception as e:
+            self.logger.exception(f'Siege backfill of {channel.name} failed')
+            self.bot.queue_log_to_discord(f'{label} stopped: {e}, run it again to resume', silent=False)
+            return
+
+        if status_message:
+            await status_message.edit(content=f'{label} finished in {progress.elapsed:.0f}s: {describe(progress)}')
+
     @siege.command(description='Add a new city/gate that we can siege')
     @discord.app_commands.describe(
         name='Name of the city (e.g. "Ochyro Zoni")',
@@ -172,13 +413,108 @@ class Siege(discord.ext.commands.Cog):
 
         id = name.replace(' ', '').lower()
 
-        city = City(id, name, level, deep_link, coordinates, region)
+        try:
+            coords = parse_coords(coordinates)
+        except ValueError as e:
+            return await interaction.response.send_message(str(e), ephemeral=True)
+
+        city = City(id, name, level, deep_link, coords, region)
 
-        self.cities.update({id: city})
-        self.save_cities()
+        await self.save_city(city)
 
         await interaction.response.send_message(f'City added: {city.full_name}', ephemeral=True)
 
+    @siege.command(description='Change the details of a city/gate that we can siege')
+    @discord.app_commands.describe(
+        city='Select the city to change',
+        name='New name of the city',
+        level='New numeric level (e.g. "5")',
+        coordinates='New coordinates of the city (e.g. `808,1480`, note no space or brackets)',
+        deep_link='New link provided when sharing in game to an external app',
+        region='New name of the region the city is in (e.g. "Orion")'
+    )
+    async def update_city(self, interaction: discord.Interaction, city: str, name: str = None, level: int = None, coordinates: str = None, deep_link: str = None, region: str = None):
+        await self.bot.log_command_to_discord('siege.update_city', interaction.user, interaction.channel, {'city': city, 'name': name, 'level': level})
+
+        try:
+            existing = self.get_city(city)
+        except KeyError:
+            return await interaction.response.send_message(f'There is no city `{city}`', ephemeral=True)
+
+        try:
+            coords = parse_coords(coordinates)
+        except ValueError as e:
+            return await interaction.response.send_message(str(e), ephemeral=True)
+
+        changes = {'name': name, 'level': level, 'coords': coords, 'deep_link': deep_link, 'region': region}
+        updated = existing._replace(**{field: value for field, value in changes.items() if value is not None})
+
+        await self.save_city(updated)
+
+        await interaction.response.send_message(f'City updated: {updated.full_name}', ephemeral=True)
+
+    @siege.command(description='Remove a city/gate that we can no longer siege')
+    @discord.app_commands.describe(city='Select the city to remove')
+    async def remove_city(self, interaction: discord.Interaction, city: str):
+        await self.bot.log_command_to_discord('siege.remove_city', interaction.user, interaction.channel, {'city': city})
+
+        removed = self.cities.get(city)
+        if removed is None:
+            return await interaction.response.send_message(f'There is no city `{city}`', ephemeral=True)
+
+        await self.city_store.remove(city)
+
+        self.cities.pop(city, None)
+        self.index_cities()
+
+        await interaction.response.send_message(f'City removed: {removed.full_name}', ephemeral=True)
+
+    @update_city.autocomplete('city')
+    @remove_city.autocomplete('city')
+    async def autocomplete_any_city(self, interaction: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
+        # By name only, the region option of these commands is the city's new region rather than a filter
+        try:
+            return [
+                discord.app_commands.Choice(name=city.full_name, value=city.id)
+                for city in self.city_index.search(current, limit=25)
+            ]
+        except:
+            self.logger.exception('Error autocompleting city to change')
+
+    @siege.command(description='List the cities near a position on the map')
+    @discord.app_commands.describe(
+        coordinates='The position to search around (e.g. `808,1480`)',
+        radius='How far from the position to look',
+        min_level='Only list cities of at least this level',
+    )
+    async def nearby(self, interaction: discord.Interaction, coordinates: str, radius: discord.app_commands.Range[int, 1, 5000] = 200, min_level: int = 0):
+        await self.bot.log_command_to_discord('siege.nearby', interaction.user, interaction.channel, {'coordinates': coordinates, 'radius': radius, 'min_level': min_level})
+
+        try:
+            coords = parse_coords(coordinates)
+        except ValueError as e:
+            return await interaction.response.send_message(str(e), ephemeral=True)
+
+        if coords is None:
+            return await interaction.response.send_message('Coordinates must be in the format `x,y`', ephemeral=True)
+
+        nearby = [(distance, city) for distance, city in self.city_grid.within(coords, radius) if city.level >= min_level]
+
+        if not nearby:
+            return await interaction.response.send_message(f'No cities within {radius} of ({format_coords(coords)})', ephemeral=True)
+
+        message = f'Cities within {radius} of ({format_coords(coords)}):'
+        for distance, city in nearby[:25]:
+            message += f"\n\t{city.full_name} ({city.coords_text}) {distance:.0f} away"
+
+            if city.region:
+                message += f" in {city.region}"
+
+        if len(nearby) > 25:
+            message += f"\n\t...and {len(nearby) - 25} more"
+
+        await interaction.response.send_message(message, ephemeral=True)
+
     @siege.command(description='List the currently configured cities available for us to siege')
     async def list_cities(self, interaction: discord.Interaction):
         await self.bot.log_command_to_discord('siege.list_cities', interaction.user, interaction.channel)
@@ -189,11 +525,11 @@ class Siege(discord.ext.commands.Cog):
 
             if city.deep_link:
                 if city.coords:
-                    message += f" [({city.coords})]({city.deep_link})"
+                    message += f" [({city.coords_text})]({city.deep_link})"
                 else:
                     message += f" [game link]({city.deep_link})"
             elif city.coords:
-                message += f' ({city.coords})'
+                message += f' ({city.coords_text})'
 
         await interaction.response.send_message(message, ephemeral=True)
 
@@ -1,17 +1,23 @@
 # Original ELK Bot created by Richard Mongrolle
 
 import os
-import json
+import time
+import asyncio
+import aiohttp
 import discord
-import io
+import tempfile
 import logging
 import re
-import flag
+from collections import OrderedDict
 from discord.ext import commands
-from datetime import datetime
-from zoneinfo import ZoneInfo
-from langdetect import detect, DetectorFactory, LangDetectException
-from googletrans import Translator
+from datetime import timedelta
+from typing import Optional
+from utils.announcements import publish_announcement
+from utils.config import JsonConfigStore
+from utils.debounce import KeyedDebouncer
+from utils.language_filter import language_roles, skip_reason
+from utils.missions import parse_mission_channel, parse_mission_post
+from utils.translation import DetectionError, TranslationCache, TranslationService
 
 
 logger = logging.getLogger('discord.elkbot.v1')
@@ -19,14 +25,22 @@ logger = logging.getLogger('discord.elkbot.v1')
 
 # -----------------------
 # 0.4 - config.json
+def validate_config(config):
+    if not isinstance(config, dict):
+        raise ValueError('v1 config must be a JSON object')
+    if not isinstance(config.get('translation_enabled'), bool):
+        raise ValueError('v1 config `translation_enabled` must be true or false')
+
+
+CONFIG = JsonConfigStore('./config/v1.json', check_interval=5.0, validator=validate_config)
+
+
 def load_config():
-    with open('./config/v1.json', 'r') as config_file:
-        return json.load(config_file)
+    return CONFIG.get()
 
 
-def save_config(config):
-    with open('./config/v1.json', 'w') as config_file:
-        json.dump(config, config_file, indent=4)
+async def save_config(config):
+    await CONFIG.save(config)
 
 
 # -----------------------
@@ -35,17 +49,9 @@ async def log_task(ctx, task_name, details):
     # Log the task with the current timestamp
     logger.debug(f'Channel Name: {ctx.channel.name} - User: {ctx.author.name} - Task: {task_name} - {details}')
 
-    # Send the log to the specified Discord channel
-    try:
-        log_channel_id = os.getenv('DISCORD_BOT_CHANNEL')
-        if not log_channel_id:
-            logger.debug(f'Discord bot channel has not been configured')
-            return
-        log_channel = await ctx.guild.fetch_channel(log_channel_id)
-        log_message = f'Legacy command {task_name} called by {ctx.author.mention} in {ctx.channel.mention} with ```{details}```'
-        await log_channel.send(log_message, silent=True)
-    except Exception as e:
-        logger.warning(f'Could not log command to Discord bot channel: {e}')
+    # Queue the log for the bot channel, it is sent batched with other log lines
+    log_message = f'Legacy command {task_name} called by {ctx.author.mention} in {ctx.channel.mention} with ```{details}```'
+    BOT.queue_log_to_discord(log_message)
 
 
 # ==============================
@@ -104,12 +110,28 @@ async def anonymize(ctx):
 
 # -----------------------
 # 2.3 - Configure logging when the bot receives the 'delete' command
+# Discord only allows bulk deleting messages younger than 14 days (we leave a little margin)
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+BULK_DELETE_CHUNK = 100
+# Concurrent single deletes for messages too old to bulk delete
+DELETE_CONCURRENCY = 3
+# How far back we look for matching messages when filtering
+DELETE_SCAN_LIMIT = 5000
+
+
+class DeleteFilters(commands.FlagConverter):
+    author: Optional[discord.User] = None
+    contains: Optional[str] = None
+    before: Optional[int] = None
+    after: Optional[int] = None
+
+
 @commands.command(name='delete')
 @commands.check(check_role)
-async def delete_messages(ctx, num_messages: int):
+async def delete_messages(ctx, num_messages: int, *, filters: DeleteFilters):
     """
-    Delete a specified number of messages.
-    Usage: !delete <Number messages>
+    Delete a specified number of messages, optionally only those matching the filters.
+    Usage: !delete <Number messages> [author: <Member>] [contains: <text>] [before: <Message ID>] [after: <Message ID>]
     """
     try:
         # Check if the command is in a text channel
@@ -119,22 +141,92 @@ async def delete_messages(ctx, num_messages: int):
 
             # Check if the number of messages to delete is greater than 0
             if num_messages > 0:
-                # Fetch the last 'num_messages' messages in the channel
-                messages = ctx.channel.history(limit=num_messages)
-
-                # Use an async for loop to extract messages from the async generator
-                messages_list = []
-                async for message in messages:
-                    messages_list.append(message)
-                    if len(messages_list) == num_messages + 1:
-                        break  # Stop after fetching the required number of messages
-
-                # Delete the fetched messages
-                for message in messages_list:
-                    await message.delete()
+                # Only scan past the number of messages we want when filtering on author/content, and only so far
+                filtering = filters.author or filters.contains
+                scan_note = f" (of the last {DELETE_SCAN_LIMIT} messages)" if filtering else ""
+
+                start = time.perf_counter()
+                progress = await ctx.send(f"Deleting {num_messages} matching messages{scan_note}..." if filtering else f"Deleting {num_messages} messages...", silent=True)
+
+                bulk_cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+                semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+                async def delete_old_message(message):
+                    async with semaphore:
+                        try:
+                            await message.delete()
+                            return 1
+                        except discord.NotFound:
+                            return 0
+
+                history = ctx.channel.history(
+                    limit=DELETE_SCAN_LIMIT if filtering else num_messages,
+                    before=discord.Object(filters.before) if filters.before else ctx.message,
+                    after=discord.Object(filters.after) if filters.after else None,
+                    oldest_first=False,
+                )
+
+                # Filter and delete in a single pass over the history
+                scanned = 0
+                matched = 0
+                deleted = 0
+                chunk = []
+                old_deletes = []
+                async for message in history:
+                    scanned += 1
+
+                    if filters.author and message.author.id != filters.author.id:
+                        continue
+                    if filters.contains and filters.contains.lower() not in message.content.lower():
+                        continue
+
+                    matched += 1
+
+                    if message.created_at > bulk_cutoff:
+                        chunk.append(message)
+
+                        if len(chunk) == BULK_DELETE_CHUNK:
+                            await ctx.channel.delete_messages(chunk)
+                            deleted += len(chunk)
+                            chunk = []
+                            await progress.edit(content=f"Deleted {deleted}/{num_messages} messages...")
+                    else:
+                        old_deletes.append(asyncio.create_task(delete_old_message(message)))
+
+                    if matched >= num_messages:
+                        break
+
+                if chunk:
+                    await ctx.channel.delete_messages(chunk)
+                    deleted += len(chunk)
+
+                failures = []
+                if old_deletes:
+                    await progress.edit(content=f"Deleted {deleted}/{matched} messages, deleting {len(old_deletes)} messages older than 14 days...")
+
+                    # Wait for every delete, even if some fail (e.g. Forbidden), and count the ones that did
+                    for result in await asyncio.gather(*old_deletes, return_exceptions=True):
+                        if isinstance(result, BaseException):
+                            failures.append(result)
+                        else:
+                            deleted += result
+
+                elapsed = time.perf_counter() - start
+                failed = f", {len(failures)} could not be deleted" if failures else ""
+
+                # Fewer matches than asked for because the scan stopped, not because there are no more
+                limited = ""
+                if filtering and matched < num_messages and scanned >= DELETE_SCAN_LIMIT:
+                    limited = f" (stopped after scanning the last {DELETE_SCAN_LIMIT} messages, use `before:` to go further back)"
+
+                await progress.edit(content=f"Deleted {deleted} messages in {elapsed:.1f}s{failed}{limited}.", delete_after=10)
+
+                if failures:
+                    await send_error_to_discord(ctx, f"{len(failures)} messages older than 14 days could not be deleted: {failures[0]}")
 
                 # Call the log_task function
-                await log_task(ctx, 'Delete messages', f'{num_messages}')
+                filter_description = ', '.join(f'{name}: {value}' for name, value in filters if value is not None)
+                await log_task(ctx, 'Delete messages', f'{num_messages} ({filter_description or "no filters"}), {deleted} deleted{failed} in {elapsed:.1f}s{limited}')
             else:
                 # Send the warning message and delete it after 10 seconds
                 await ctx.send("Please provide a valid number of messages to delete (greater than 0).", delete_after=10)
@@ -145,6 +237,28 @@ async def delete_messages(ctx, num_messages: int):
 
 # -----------------------
 # 2.4 - Configure logging when the bot receives the 'rewrite' command
+# Attachments are downloaded in chunks, and spooled to a temp file once they are bigger than this
+REWRITE_SPOOL_THRESHOLD = 1024 * 1024
+REWRITE_CHUNK_SIZE = 64 * 1024
+
+
+async def download_attachment(session, attachment):
+    """Stream an attachment into a temp file that only touches the disk once it gets large"""
+    spool = tempfile.SpooledTemporaryFile(max_size=REWRITE_SPOOL_THRESHOLD)
+
+    try:
+        async with session.get(attachment.url) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(REWRITE_CHUNK_SIZE):
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return discord.File(spool, filename=attachment.filename, spoiler=attachment.is_spoiler(), description=attachment.description)
+
+
 @commands.command(name='rewrite')
 @commands.check(check_role)
 async def rewrite_message(ctx, user_id: int, message_id: int):
@@ -159,44 +273,52 @@ async def rewrite_message(ctx, user_id: int, message_id: int):
             await ctx.message.delete()
 
             try:
-                # Fetch the user by ID
-                user = await BOT.fetch_user(user_id)
-
                 # Fetch the message with the specified ID
                 message = await ctx.channel.fetch_message(message_id)
-
-                # Check if the user and message are found
-                if user and message:
-                    # Check if the message is sent by the specified user
-                    if message.author.id == user.id:
-                        # Delete the original message
-                        await message.delete()
-
-                        # Send a new message mimicking the original content
-                        if message.content:
-                            await ctx.send(content=message.content)
-
-                        # Check if the original message has attachments (images)
-                        if message.attachments:
-                            for attachment in message.attachments:
-                                # Download the attachment
-                                attachment_content = await attachment.read()
-
-                                # Send the attachment with the new message
-                                await ctx.send(
-                                    file=discord.File(io.BytesIO(attachment_content), filename=attachment.filename))
-
-                        # Call the log_task function
-                        await log_task(ctx, 'Rewrite message', f'User ID: {user.id}, Message ID: {message.id}')
-                    else:
-                        # Send an error message if the message is not from the specified user
-                        await ctx.send("You can only rewrite messages from the specified user.", delete_after=10)
-                else:
-                    # Send an error message if the user or message is not found
-                    await ctx.send("User or message not found.", delete_after=10)
             except discord.NotFound:
-                # Send an error message if the user or message is not found
+                # Send an error message if the message is not found
                 await ctx.send("User or message not found.", delete_after=10)
+                return
+
+            # Check if the message is sent by the specified user
+            if message.author.id != user_id:
+                # Send an error message if the message is not from the specified user
+                await ctx.send("You can only rewrite messages from the specified user.", delete_after=10)
+                return
+
+            # Check the attachments will fit in a single message from the bot
+            total_size = sum(attachment.size for attachment in message.attachments)
+            if total_size > ctx.guild.filesize_limit:
+                await ctx.send(f"Attachments are too large to rewrite ({total_size / 1024 / 1024:.1f}MB, the limit is {ctx.guild.filesize_limit / 1024 / 1024:.0f}MB).", delete_after=10)
+                return
+
+            files = []
+            try:
+                # Download all the attachments (images etc.) before touching the original message
+                if message.attachments:
+                    async with aiohttp.ClientSession() as session:
+                        results = await asyncio.gather(
+                            *(download_attachment(session, attachment) for attachment in message.attachments),
+                            return_exceptions=True,
+                        )
+
+                    files = [result for result in results if isinstance(result, discord.File)]
+                    errors = [result for result in results if isinstance(result, BaseException)]
+                    if errors:
+                        raise errors[0]
+
+                # Send a new message mimicking the original content and attachments
+                if message.content or files:
+                    await ctx.send(content=message.content or None, files=files or None)
+            finally:
+                for file in files:
+                    file.close()
+
+            # Delete the original message
+            await message.delete()
+
+            # Call the log_task function
+            await log_task(ctx, 'Rewrite message', f'User ID: {user_id}, Message ID: {message.id}, Attachments: {len(message.attachments)} ({total_size} bytes)')
         pass
     except Exception as e:
         await send_error_to_discord(ctx, str(e))
@@ -207,12 +329,29 @@ async def rewrite_message(ctx, user_id: int, message_id: int):
 @commands.command(name='toggletranslation')
 @commands.check(check_role)
 async def toggle_translation(ctx):
-    config = load_config()
+    config = dict(load_config())
     config['translation_enabled'] = not config['translation_enabled']
-    save_config(config)
+    await save_config(config)
     state = "**enabled**" if config['translation_enabled'] else "**disabled**"
     await ctx.send(f"Automatic translation {state}.")
 
+    # Translation may have been disabled at startup, in which case the backend wasn't warmed up
+    if config['translation_enabled']:
+        TRANSLATION.start_warm_up()
+
+
+# -----------------------
+# 2.6 - Show translation cache statistics
+@commands.command(name='translationstats')
+@commands.check(check_role)
+async def translation_stats(ctx):
+    """
+    Show the translation cache hit/miss/eviction counters.
+    Usage: !translationstats
+    """
+    stats = '\n'.join(f'{key.replace("_", " ").title():12s} {value}' for key, value in TRANSLATION.cache.stats.items())
+    await ctx.send(f"# Translation Cache\n```\n{stats}\n```")
+
 
 # ==============================
 
@@ -223,19 +362,12 @@ async def toggle_translation(ctx):
 async def send_error_to_discord(ctx, error_message):
     logger.error(f"Error in `{ctx.channel.name}` by `{ctx.author.name}`:\n{error_message}")
 
-    error_channel_id = os.getenv('DISCORD_BOT_CHANNEL')
-
-    try:
-        error_channel = await BOT.fetch_channel(error_channel_id)
-        if error_channel:
-            await error_channel.send(f"Error in `{ctx.channel.name}` by `{ctx.author.name}`:\n{error_message}")
-        else:
-            logger.error(f"Can't find the channel {error_channel_id}")
-    except Exception as e:
-        logger.error(f"Error when trying to send the message: {e}")
+    BOT.queue_log_to_discord(f"Error in `{ctx.channel.name}` by `{ctx.author.name}`:\n{error_message}", silent=False)
 
 
 BOT = None
+TRANSLATION = None
+FLAG_REACTIONS = None
 
 
 async def setup(bot):
@@ -243,12 +375,17 @@ async def setup(bot):
     bot.add_command(delete_messages)
     bot.add_command(rewrite_message)
     bot.add_command(toggle_translation)
+    bot.add_command(translation_stats)
 
     bot.created_post_id = None
 
-    global BOT
+    global BOT, TRANSLATION, FLAG_REACTIONS
     BOT = bot
 
+    # Edits to v1.json are picked up by the bot's file watcher, so the store doesn't need to check itself
+    CONFIG.check_interval = float('inf')
+    bot.file_watcher.watch(CONFIG.path, CONFIG.read, CONFIG.swap)
+
     # ==============================
 
     # 3 - EVENTS
@@ -279,7 +416,24 @@ async def setup(bot):
 
     # -----------------------
     # 4.2 - Automatically translate messages if they are not in English
-    translator = Translator()
+    TRANSLATION = TranslationService(
+        workers=int(os.getenv('TRANSLATION_WORKERS', 2)),
+        timeout=float(os.getenv('TRANSLATION_TIMEOUT', 10)),
+        cache=TranslationCache(
+            max_entries=int(os.getenv('TRANSLATION_CACHE_SIZE', 2048)),
+            ttl=float(os.getenv('TRANSLATION_CACHE_TTL', 7 * 24 * 60 * 60)),
+            database_path=os.getenv('TRANSLATION_CACHE_PATH', './data/translations.db') or None,
+        ),
+    )
+    await TRANSLATION.cache.load()
+
+    # Load the language profiles now, rather than on the first message after startup or a reload, unless
+    # there is nothing to translate (toggling translation on warms it up then)
+    if load_config()['translation_enabled']:
+        TRANSLATION.start_warm_up()
+        bot.startup_timer.note('translation warm up', 'started')
+    else:
+        bot.startup_timer.note('translation warm up', 'skipped (translation disabled)')
 
     @bot.event
     async def on_message(message):
@@ -292,74 +446,52 @@ async def setup(bot):
             return
 
         if '-missions' in message.channel.name:
-            # Extraction des deux chiffres du nom du canal
-            channel_match = re.search(r's(\d{2})-missions', message.channel.name)
-
-            # IF channel = sXX-missions channel
-            if channel_match:
-                # Création de la mention du groupe
-                group_number = channel_match.group(1)
-                group_mention = f"@Server {group_number}"
-                pattern = r'^Lvl (\d+) (.+)\n(\d{1,2}:\d{2} [apAP][mM]) (\d{2}/\d{2})'
-                match = re.match(pattern, message.content)
-            else:
-                group_mention = ""
-                # Expression régulière pour détecter le format spécifique
-                pattern = r'^Lvl (\d+) (.+)\n(\d{1,2}:\d{2} [apAP][mM]) (\d{2}/\d{2})'
-                match = re.match(pattern, message.content)
-
-            # Trouver l'ID du rôle basé sur le numéro de groupe
-            role_number = channel_match.group(1) if channel_match else None
-            role_id = None
-            if role_number:
-                # Recherche du rôle par son nom (par exemple, "Server 01")
-                role_name = f"Server {role_number}"
-                role = discord.utils.get(message.guild.roles, name=role_name)
-                if role:
-                    role_id = role.id
+            # Extraction des deux chiffres du nom du canal (e.g. "01" for s01-missions)
+            role_number = parse_mission_channel(message.channel.name)
 
-            # IF formatting respect standards
-            if match:
-                # Extraction des données
-                level, content, time_str, date_str = match.groups()
-
-                # Obtenir l'année actuelle
-                current_year = datetime.now().year
-
-                # Utilisation de zoneinfo pour la conversion en UTC
-                time_str = time_str.replace(" UTC", "")
-                # Ajouter l'année actuelle lors du parsing de la date et de l'heure
-                event_time = datetime.strptime(f"{date_str}/{current_year} {time_str}", '%d/%m/%Y %I:%M %p')
-                event_time = event_time.replace(tzinfo=ZoneInfo('UTC'))
+            try:
+                mission = parse_mission_post(message.content)
+            except ValueError as e:
+                # Formatted as a mission but the date doesn't exist, keep the post so it can be fixed
+                await send_error_to_discord(ctx, f"Invalid mission date in {message.jump_url}: {e}")
+                return
 
-                # Générer le temps UNIX
-                unix_time = int(event_time.timestamp())
+            # IF formatting respect standards
+            if mission:
+                # Trouver l'ID du rôle basé sur le numéro de groupe (par exemple, "Server 01")
+                role = BOT.role_index.get(message.guild, f"Server {role_number}") if role_number else None
 
                 # Création des timestamps Discord
-                timestamp = f"<t:{unix_time}:t>"
-                countdown_timestamp = f"<t:{unix_time}:R>"
+                timestamp = f"<t:{mission.unix_time}:t>"
+                countdown_timestamp = f"<t:{mission.unix_time}:R>"
 
                 # Créer la mention du rôle s'il a été trouvé
-                role_mention = f"<@&{role_id}>" if role_id else ""
+                role_mention = role.mention if role else ""
 
                 # Reformater et envoyer le message
-                formatted_message = f"# Lvl {level} {content}\nAt {timestamp}\nIt's {countdown_timestamp}\nReact with ✅ if you will be there, or with ❌ if you can't. If you don't know, use ❓."
-                sent_message = await message.channel.send(formatted_message)
-
-                # Ajouter plusieurs réactions au message envoyé
-                emojis_to_add = ["✅", "❌", "❓"]  # Liste des emojis à ajouter
-
-                for emoji in emojis_to_add:
-                    await sent_message.add_reaction(emoji)  # Ajouter chaque emoji de la liste
-
-                # Créer un fil de discussion à partir du message envoyé
-                thread = await sent_message.create_thread(name=f"Lvl {level} {content}", auto_archive_duration=1440)
-
-                # Envoyer un message dans le fil
-                await thread.send(role_mention)
-
-                # Supprimer le message initial
-                await message.delete()
+                formatted_message = f"# {mission.title}\nAt {timestamp}\nIt's {countdown_timestamp}\nReact with ✅ if you will be there, or with ❌ if you can't. If you don't know, use ❓."
+
+                # Suivre les réactions à la mission dans le registre des sièges dès l'envoi, avant que quiconque ne puisse réagir
+                siege_cog = BOT.get_cog('Siege')
+
+                async def track(sent: discord.Message):
+                    if siege_cog:
+                        await siege_cog.ledger.add_siege(sent.id, sent.channel.id, mission.title, mission.unix_time)
+
+                # Envoyer le message, puis ajouter les réactions, créer le fil et supprimer le message initial en parallèle
+                announcement = await publish_announcement(
+                    message.channel,
+                    formatted_message,
+                    reactions=["✅", "❌", "❓"],
+                    thread_name=mission.title,
+                    thread_content=role_mention or None,
+                    source_message=message,
+                    name='mission',
+                    on_sent=track,
+                )
+
+                if announcement.errors:
+                    await send_error_to_discord(ctx, f"Mission post incomplete, failed steps: {', '.join(announcement.errors)}")
 
             else:
                 # Traitement normal pour les autres messages
@@ -392,25 +524,28 @@ async def setup(bot):
         config = load_config()
         if config['translation_enabled']:
             try:
-                if len(message.content) > 10:
-                    DetectorFactory.seed = 0  # For consistent language detection
-                    detected_lang = detect(message.content)
-
-                    # User language roles (considering all roles as potential language codes)
-                    user_language_roles = {role.name.lower() for role in message.author.roles}
-
-                    # Check if the detected language matches any of the user's roles
-                    if detected_lang in user_language_roles:
-                        # Translate the message into English
-                        translated = translator.translate(message.content, src=detected_lang, dest='en')
-                        flag_emoji = f":flag_{detected_lang}:"
-                        await message.reply(f"{flag_emoji} -> :flag_gb: ・ {translated.text}")
-            except LangDetectException as e:
+                # User language roles (considering all roles as potential language codes)
+                user_language_roles = language_roles(role.name for role in getattr(message.author, 'roles', []))
+
+                # Skip detection for messages that can't or don't need to be translated
+                if not skip_reason(message.content, user_language_roles):
+                    with BOT.metrics.time('translation', 'auto_translate'):
+                        detected_lang = await TRANSLATION.detect(message.content)
+
+                        # Check if the detected language matches any of the user's roles
+                        if detected_lang in user_language_roles:
+                            # Translate the message into English
+                            translated = await TRANSLATION.translate(message.content, src=detected_lang, dest='en')
+                            flag_emoji = f":flag_{detected_lang}:"
+                            await message.reply(f"{flag_emoji} -> :flag_gb: ・ {translated}")
+            except DetectionError as e:
                 if str(e) == 'No features in text.':
                     logger.warning(f'Auto translate: no feature in text "{message.content}"')
                 else:
                     logger.exception(f'Could not detect language for auto translate ({e.code})')
                     await send_error_to_discord(ctx, 'Could not detect language for auto translate')
+            except asyncio.TimeoutError:
+                logger.warning(f'Auto translate timed out for message {message.id}')
             except Exception as e:
                 logger.exception(e)
                 error_message = f"Translation Error: {str(e)}"
@@ -422,6 +557,68 @@ async def setup(bot):
 
     # -----------------------
     # 4.3 - Manualy translate messages when someone react with a flag
+    # Flags added to the same message within a short window are translated in one batch and answered
+    # with a single reply, which is edited in place when more languages are requested later on.
+    translation_replies = OrderedDict()
+
+    async def flush_flag_reactions(message_id, requests):
+        original_message = requests[0][2].message
+        reply, lines = translation_replies.get(message_id, (None, {}))
+
+        # Skip duplicate flags and languages we've already replied with
+        wanted = {}
+        for lang_code, emoji, _, _ in requests:
+            if lang_code not in lines and lang_code not in wanted:
+                wanted[lang_code] = emoji
+
+        errors = []
+
+        if wanted:
+            # Detection is cached, so messages already seen by auto translate share their results
+            try:
+                source_lang = await TRANSLATION.detect(original_message.content)
+            except DetectionError:
+                source_lang = 'en'
+
+            source_flag = ':flag_gb:' if source_lang == 'en' else f':flag_{source_lang}:'
+
+            results = await asyncio.gather(
+                *(TRANSLATION.translate(original_message.content, src=source_lang, dest=lang_code) for lang_code in wanted),
+                return_exceptions=True,
+            )
+
+            new_lines = {}
+            for (lang_code, emoji), result in zip(wanted.items(), results):
+                if isinstance(result, BaseException):
+                    errors.append(f"{lang_code}: {str(result) or type(result).__name__}")
+                else:
+                    new_lines[lang_code] = f"{source_flag} -> {emoji} ・ {result}"
+
+            if new_lines:
+                content = '\n'.join([*lines.values(), *new_lines.values()])
+
+                if reply and len(content) <= 2000:
+                    lines.update(new_lines)
+                    await reply.edit(content=content)
+                else:
+                    lines = new_lines
+                    reply = await original_message.reply('\n'.join(lines.values()))
+
+                translation_replies[message_id] = (reply, lines)
+                translation_replies.move_to_end(message_id)
+                while len(translation_replies) > 256:
+                    translation_replies.popitem(last=False)
+
+        await asyncio.gather(*(reaction.remove(user) for _, _, reaction, user in requests), return_exceptions=True)
+
+        if errors:
+            error_message = f"Translation Error: {', '.join(errors)}"
+            await original_message.channel.send(error_message)
+
+            ctx = await BOT.get_context(original_message)
+            await send_error_to_discord(ctx, error_message)
+
+    FLAG_REACTIONS = KeyedDebouncer(float(os.getenv('TRANSLATION_REACTION_WINDOW', 2)), flush_flag_reactions)
 
     @bot.event
     async def on_reaction_add(reaction, user):
@@ -429,33 +626,32 @@ async def setup(bot):
         if len(reaction.emoji) != 2 or user == BOT.user:
             return
 
+        # Only needed once someone reacts, so it isn't imported at startup
+        import flag
+
         flag_code = flag.dflagize(reaction.emoji)
         flag_match = re.match(r":([A-Z]{2}):", flag_code)
 
         if not flag_match:
             return
 
-        lang_code = flag_match.group(1)
-        original_message = reaction.message
+        lang_code = flag_match.group(1).lower()
 
-        if lang_code.lower() in ['gb', 'us']:
+        if lang_code in ['gb', 'us']:
             lang_code = 'en'
 
-        try:
-            translated = translator.translate(original_message.content, src='en', dest=lang_code)
-            await original_message.reply(f":flag_gb: -> {reaction.emoji} ・ {translated.text}")
-            await reaction.remove(user)
-        except Exception as e:
-            error_message = f"Translation Error: {str(e)}"
-            await original_message.channel.send(error_message)
-
-            ctx = await BOT.get_context(original_message)
-            await send_error_to_discord(ctx, error_message)
-
-            raise
+        FLAG_REACTIONS.add(reaction.message.id, (lang_code, reaction.emoji, reaction, user))
 
     logger.info('Legacy bot loaded')
 
 
 async def teardown(bot):
+    bot.file_watcher.unwatch(CONFIG.path)
+
+    if FLAG_REACTIONS:
+        FLAG_REACTIONS.cancel_all()
+
+    if TRANSLATION:
+        TRANSLATION.close()
+
     logger.info('Legacy bot unloaded')
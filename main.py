@@ -1,53 +1,153 @@
+# Time the imports below, and the rest of startup, for the startup report logged when the bot is ready
+from utils.startup import StartupTimer
+startup_timer = StartupTimer()
+startup_timer.install()
+
 import os
+import json
+import time
 import typing
+import asyncio
+import hashlib
+import functools
 import logging
 import logging.handlers
 import dotenv
 from enum import Enum
 import datetime
 import discord
+from discord import app_commands
 from discord.ext import commands
-from distutils.util import strtobool
-
+from utils.config import atomic_write_json, strtobool
+from utils.announcements import recent_timings, timings_report
+from utils.discord_log import DiscordLogSink
+from utils.file_watcher import FileWatcher
+from utils.log import parse_levels, setup_logging
+from utils.metrics import Metrics
+from utils.rest_stats import RestStats
+from utils.roles import RoleIndex
+from utils.watchdog import LoopWatchdog
+
+startup_timer.mark('imports')
 
 # Ensure we load environment variables
 dotenv.load_dotenv()
 
+# Send REST requests to another Discord API, e.g. the local stand-in in benchmarks/fake_discord.py
+if os.getenv('DISCORD_API_BASE'):
+    discord.http.Route.BASE = os.getenv('DISCORD_API_BASE')
 
-# Setup logging to go to rotating files
+
+# Setup logging to go to rotating files (and the console, unless LOG_CONSOLE=false), written from a background thread
+# LOG_FORMAT=json writes JSON lines, LOG_LEVELS sets logger levels (e.g. "discord=INFO,discord.elkbot=DEBUG")
 discord_logger = logging.getLogger('discord')
 handler = logging.handlers.TimedRotatingFileHandler(filename='logs/bot.log', when='W0', backupCount=4, utc=True, atTime=datetime.time())
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-discord_logger.addHandler(handler)
+log_handlers = [handler]
+if strtobool(os.getenv('LOG_CONSOLE', 'true')):
+    log_handlers.append(logging.StreamHandler())
+# discord.py's own logging setup (which bot.run skips, see below) logged discord at INFO
+log_levels = {'discord': logging.INFO, **parse_levels(os.getenv('LOG_LEVELS'))}
+log_listener = setup_logging(discord_logger, *log_handlers, json_lines=os.getenv('LOG_FORMAT') == 'json', levels=log_levels)
+
+
+class ELKCommandTree(app_commands.CommandTree):
+    """Times every app command (slash and context menu) for the bot's metrics"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['started'] = time.perf_counter()
+
+        # Name the task for the loop watchdog, it only runs this interaction
+        if interaction.command:
+            self.client.watchdog.set_label(f'app command {interaction.command.qualified_name}')
+            self.client.rest_stats.set_handler('app_command', interaction.command.qualified_name)
+
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if interaction.command and 'started' in interaction.extras:
+            self.client.metrics.observe('app_command', interaction.command.qualified_name, time.perf_counter() - interaction.extras['started'], error=True)
+
+        await super().on_error(interaction, error)
 
 
 class ELKBot(commands.Bot):
+    # Hashes of the app commands last synced to each guild, so unchanged commands aren't synced again
+    command_sync_file = f"{os.getcwd()}/data/command_sync.json"
+
+    # Loaded concurrently by setup_hook, so they must not depend on each other while loading
+    startup_extensions = ('commands.info', 'commands.siege', 'commands.v1')
+
     # region Bot Setup
 
     def __init__(self, *args, **kwargs):
-        self.dev_mode = bool(strtobool(os.getenv('DEVELOPMENT', False)))
+        self.dev_mode = bool(strtobool(os.getenv('DEVELOPMENT', 'false')))
         self.expected_guild = None
         self.bot_channel = None
+        self.ready_once = False
+        # Lines logged before setup_hook knows the bot channel are queued until then
+        self.log_sink = DiscordLogSink(None, flush_interval=float(os.getenv('DISCORD_LOG_FLUSH_INTERVAL', 3)))
+        self.role_index = RoleIndex()
+        self.metrics = Metrics()
+        self.rest_stats = RestStats()
+        self.watchdog = LoopWatchdog(
+            threshold=float(os.getenv('LOOP_WATCHDOG_THRESHOLD', 0.5)),
+            report_interval=float(os.getenv('LOOP_WATCHDOG_REPORT_INTERVAL', 60)),
+            on_report=self.report_loop_stall,
+        )
+        self.file_watcher = FileWatcher(interval=float(os.getenv('CONFIG_WATCH_INTERVAL', 2)), on_error=self.on_config_error)
+        # Extensions note what they did (or skipped) at startup in its report
+        self.startup_timer = startup_timer
 
         self.logger = logging.getLogger('discord.elkbot')
-        self.logger.setLevel(logging.DEBUG)
+        if self.logger.level == logging.NOTSET:
+            self.logger.setLevel(logging.DEBUG)
 
         self.logger.info(f'ELKBot.__init__({args}, {kwargs})')
 
-        super().__init__(*args, **kwargs)
+        # Every REST request is counted against the command or event making it
+        super().__init__(*args, tree_cls=ELKCommandTree, http_trace=self.rest_stats.trace_config(), **kwargs)
+
+        # Our own event handlers, those set with @bot.event and cog listeners are timed as they are added
+        for name in dir(type(self)):
+            if name.startswith('on_') and asyncio.iscoroutinefunction(getattr(self, name)):
+                setattr(self, name, self.timed_event(name, getattr(self, name)))
 
     async def setup_hook(self):
         self.logger.info(f'ELKBot.setup_hook()')
 
-        self.bot_channel = await self.get_bot_channel()
+        self.file_watcher.start()
 
-        await bot.load_extension('commands.info')
-        await bot.load_extension('commands.siege')
-        await bot.load_extension('commands.v1')
+        # Opt in to reports of what is blocking the event loop (LOOP_WATCHDOG=1)
+        if strtobool(os.getenv('LOOP_WATCHDOG', 'false')):
+            self.watchdog.start()
+
+        # Optionally export metrics as a Prometheus text file, e.g. for node_exporter's textfile collector
+        if os.getenv('METRICS_FILE'):
+            self.metrics.start_exporter(os.getenv('METRICS_FILE'), interval=float(os.getenv('METRICS_INTERVAL', 60)))
+
+        # Fetch the bot channel while the extensions load
+        self.bot_channel, *_ = await asyncio.gather(
+            startup_timer.step('bot channel', self.get_bot_channel()),
+            *(startup_timer.step(extension, self.load_extension(extension)) for extension in self.startup_extensions),
+        )
+
+        with self.rest_stats.handler('task', 'discord_log'):
+            self.log_sink.start(self.bot_channel)
+
+        # Everything the bot needs has been imported by now
+        startup_timer.uninstall()
+        startup_timer.mark('setup')
 
     async def on_ready(self):
         self.logger.debug(f'ELKBot.on_ready()')
+
+        # on_ready fires again after every gateway reconnect, there's nothing more to set up
+        if self.ready_once:
+            self.logger.info('ELKBot reconnected, skipping startup')
+            return
+        self.ready_once = True
+        startup_timer.mark('ready')
+
         start_message = await self.log_to_discord(f'ELKBot is starting: <t:{datetime.datetime.utcnow():%s}:F>')
 
         # Limit bot to a single expected guild
@@ -61,15 +161,54 @@ class ELKBot(commands.Bot):
                 self.logger.error(f'Bot connected to unexpected Guild, {guild} ({guild.id}), time to leave')
                 await guild.leave()
 
-        if self.expected_guild is None:
-            self.logger.info('Not syncing commands to guild as there is no configured expected guild')
-        else:
-            self.tree.copy_global_to(guild=self.expected_guild)
-            await self.tree.sync(guild=self.expected_guild)
+        await self.sync_command_tree()
 
         self.logger.info('ELKBot ready!')
+        startup_timer.mark('synced')
+        self.logger.info(startup_timer.report())
         await start_message.edit(content=f'ELKBot is up and running: <t:{datetime.datetime.utcnow():%s}:F>')
 
+    def read_command_sync_hashes(self) -> dict:
+        try:
+            with open(self.command_sync_file, 'r') as sync_file:
+                return json.load(sync_file)
+        except FileNotFoundError:
+            return {}
+        except Exception:
+            self.logger.exception('Could not read command sync hashes, commands will be synced')
+            return {}
+
+    async def sync_command_tree(self, force: bool = False) -> bool:
+        """Sync the app commands to the expected guild if they have changed since the last sync, returns whether it synced"""
+        if self.expected_guild is None:
+            self.logger.info('Not syncing commands to guild as there is no configured expected guild')
+            return False
+
+        self.tree.copy_global_to(guild=self.expected_guild)
+
+        # The same payload tree.sync sends, in a stable form
+        payload = [command.to_dict() for command in self.tree.get_commands(guild=self.expected_guild)]
+        payload.sort(key=lambda command: (command.get('type', 1), command['name']))
+        payload_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+        hashes = await asyncio.to_thread(self.read_command_sync_hashes)
+        guild_key = str(self.expected_guild.id)
+
+        if not force and hashes.get(guild_key) == payload_hash:
+            self.logger.info(f'Command tree unchanged ({payload_hash[:12]}), skipping sync')
+            return False
+
+        await self.tree.sync(guild=self.expected_guild)
+
+        hashes[guild_key] = payload_hash
+        try:
+            await asyncio.to_thread(atomic_write_json, self.command_sync_file, hashes)
+        except Exception:
+            self.logger.exception('Could not save command sync hash, commands will be synced again next time')
+
+        self.logger.info(f'Command tree synced ({payload_hash[:12]}){" (forced)" if force else ""}')
+        return True
+
     # endregion
     # region Command Checks
 
@@ -101,7 +240,7 @@ class ELKBot(commands.Bot):
         bot_channel_id = os.getenv('DISCORD_BOT_CHANNEL')
 
         if not bot_channel_id:
-            logger.warning('Discord bot channel has not been configured')
+            self.logger.warning('Discord bot channel has not been configured')
             return None
 
         try:
@@ -111,18 +250,23 @@ class ELKBot(commands.Bot):
             return None
 
     async def log_to_discord(self, message, silent=True):
+        """Send a message to the bot channel straight away, e.g. status messages we want to edit later"""
         if not self.bot_channel:
             return
 
         return await self.bot_channel.send(message, allowed_mentions=discord.AllowedMentions.none(), silent=silent)
 
+    def queue_log_to_discord(self, message, silent=True):
+        """Queue a log line for the bot channel, sent batched with other lines by the log sink"""
+        return self.log_sink.put(message, silent=silent)
+
     async def log_command_to_discord(self, command: str, user: discord.User, channel: discord.TextChannel, content: any = None):
         message = f'Command `{command}` called by {user.mention} in {channel.mention}'
 
         if content:
             message += f' with `{content}`'
 
-        await self.log_to_discord(message)
+        self.queue_log_to_discord(message)
 
     # endregion
     # region Error handling
@@ -143,13 +287,25 @@ class ELKBot(commands.Bot):
             command_error_msg = str(error)
             command = command_error_msg[9:command_error_msg.find('"', 9)]
 
-            await self.log_to_discord(f"Unknown command `{command}` tried to be invoked by {ctx.author.mention} in {ctx.channel.mention} at {ctx.message.jump_url}")
+            self.queue_log_to_discord(f"Unknown command `{command}` tried to be invoked by {ctx.author.mention} in {ctx.channel.mention} at {ctx.message.jump_url}")
         else:
             self.logger.error(f'Bot command error: {type(error)} {error}')
-            await self.log_to_discord(f"Bot command error: {error}")
+            self.queue_log_to_discord(f"Bot command error: {error}")
+
+    def rest_report(self) -> str:
+        # Runs of each handler, to show what each one costs
+        runs = {f'{kind} {name}': metric.count for (kind, name), metric in self.metrics.metrics.items()}
+        return self.rest_stats.report(runs)
+
+    def report_loop_stall(self, report: str):
+        self.queue_log_to_discord(f'```\n{report[:1800]}```', silent=False)
+
+    def on_config_error(self, path: str, error: Exception):
+        self.queue_log_to_discord(f'Config file `{os.path.basename(path)}` is invalid, still using the previous version: {error}', silent=False)
 
     def on_error(self, event: str, *args, **kwargs):
         self.logger.error(f'Bot error: {event}')
+        self.metrics.count_error('event', event)
         #await self.log_to_discord(f'Bot error: {event}') # TODO howdo?
 
         return super(ELKBot, self).on_error(event, *args, **kwargs)
@@ -157,6 +313,15 @@ class ELKBot(commands.Bot):
     # endregion
     # region Debug Logging
 
+    async def close(self):
+        self.logger.debug(f'ELKBot.close()')
+        self.file_watcher.stop()
+        self.watchdog.stop()
+        await self.metrics.stop_exporter(os.getenv('METRICS_FILE'))
+        self.logger.info(f'REST requests since {datetime.datetime.fromtimestamp(self.rest_stats.started):%Y-%m-%d %H:%M:%S}:\n{self.rest_report()}')
+        await self.log_sink.close()
+        return await super().close()
+
     async def start(self, *args, **kwargs):
         self.logger.debug(f'ELKBot.start({args}, {kwargs})')
         return await super().start(*args, **kwargs)
@@ -176,6 +341,7 @@ class ELKBot(commands.Bot):
 
     async def on_guild_remove(self, guild: discord.Guild):
         self.logger.debug(f'Guild left: {guild.name} ({guild.id})')
+        self.role_index.forget(guild)
 
     async def on_guild_available(self, guild: discord.Guild):
         self.logger.debug(f'Guild available: {guild.name} ({guild.id})')
@@ -186,6 +352,63 @@ class ELKBot(commands.Bot):
     async def on_resumed(self):
         self.logger.debug(f'Bot has resumed')
 
+    # endregion
+    # region Metrics
+
+    def timed_event(self, event_name: str, handler):
+        """Wrap an event handler or listener to time it and count its REST requests, errors are counted by on_error"""
+        @functools.wraps(handler)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with self.rest_stats.handler('event', event_name):
+                    return await handler(*args, **kwargs)
+            finally:
+                self.metrics.observe('event', event_name, time.perf_counter() - start)
+
+        return timed
+
+    def event(self, coro):
+        return super().event(self.timed_event(coro.__name__, coro))
+
+    def add_listener(self, func, name: str = discord.utils.MISSING):
+        name = func.__name__ if name is discord.utils.MISSING else name
+        super().add_listener(self.timed_event(name, func), name)
+
+    def remove_listener(self, func, name: str = discord.utils.MISSING):
+        name = func.__name__ if name is discord.utils.MISSING else name
+
+        # Listeners were added wrapped, find the wrapper of this one
+        for listener in self.extra_events.get(name, []):
+            if getattr(listener, '__wrapped__', None) == func:
+                return super().remove_listener(listener, name)
+
+    async def invoke(self, ctx: commands.Context):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+
+        # Command errors are handled (and dispatched to on_command_error) within invoke
+        start = time.perf_counter()
+        with self.watchdog.labelled(f'command {ctx.command.qualified_name}'), self.rest_stats.handler('command', ctx.command.qualified_name):
+            await super().invoke(ctx)
+        self.metrics.observe('command', ctx.command.qualified_name, time.perf_counter() - start, error=ctx.command_failed)
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: typing.Union[app_commands.Command, app_commands.ContextMenu]):
+        if 'started' in interaction.extras:
+            self.metrics.observe('app_command', command.qualified_name, time.perf_counter() - interaction.extras['started'])
+
+    # endregion
+    # region Role Index
+
+    async def on_guild_role_create(self, role: discord.Role):
+        self.role_index.add(role)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.role_index.update(before, after)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.role_index.remove(role)
+
     # endregion
 
     # TODO work out a way to generically log slash/context commands
@@ -222,7 +445,7 @@ bot.check(bot.global_check)
 
 # TODO is there any way to get this into the bot class? (since it's "core" functionality)
 @bot.command(name='reload')
-async def reload(ctx: commands.Context):
+async def reload(ctx: commands.Context, force: typing.Literal['--force'] = None):
     await ctx.message.delete()
 
     reload_msg = await ctx.bot.log_to_discord(f'Reloading commands...')
@@ -235,10 +458,31 @@ async def reload(ctx: commands.Context):
         print('Not syncing commands to guild as there is no configured expected guild')
     else:
         sync_msg = await ctx.bot.log_to_discord(f'Syncing command tree...')
-        ctx.bot.tree.copy_global_to(guild=ctx.bot.expected_guild)
-        await ctx.bot.tree.sync(guild=ctx.bot.expected_guild)
-        await sync_msg.edit(content=f'Command tree synced at <t:{datetime.datetime.utcnow():%s}:F>')
+
+        if await ctx.bot.sync_command_tree(force=force is not None):
+            await sync_msg.edit(content=f'Command tree synced at <t:{datetime.datetime.utcnow():%s}:F>')
+        else:
+            await sync_msg.edit(content=f'Command tree unchanged, not synced (use `!reload --force` to sync anyway)')
+
+
+@bot.command(name='reststats')
+async def rest_stats(ctx: commands.Context, reset: typing.Literal['--reset'] = None):
+    """Show how many REST requests each command and event has made (use `--reset` to start counting again)"""
+    report = ctx.bot.rest_report()
+    await ctx.send(f'REST requests since <t:{int(ctx.bot.rest_stats.started)}:F>\n```\n{report[:1900]}```', silent=True)
+
+    if reset is not None:
+        ctx.bot.rest_stats.reset()
+
+
+@bot.command(name='announcementstats')
+async def announcement_stats(ctx: commands.Context):
+    """Show how long each step of the latest siege and mission posts took"""
+    await ctx.send(f'Latest {len(recent_timings)} announcements\n```\n{timings_report()[:1900]}```', silent=True)
 
 # endregion
 
-bot.run(os.getenv('DISCORD_TOKEN'))
+# Only run when started as a script, so the bot can be imported (e.g. by benchmarks/replay.py)
+if __name__ == '__main__':
+    # Logging is set up above, discord.py's default would reset the levels and write to stderr on the event loop
+    bot.run(os.getenv('DISCORD_TOKEN'), log_handler=None)
@@ -0,0 +1,142 @@
+import time
+import asyncio
+import logging
+import statistics
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import aiohttp
+import discord
+
+
+logger = logging.getLogger('discord.elkbot.utils.announcements')
+
+# Only errors where retrying can help, discord.py already waits out rate limits itself
+RETRYABLE_ERRORS = (discord.DiscordServerError, aiohttp.ClientError, asyncio.TimeoutError)
+STEP_ATTEMPTS = 3
+RETRY_DELAY = 0.5
+
+# Step timings of the latest announcements, newest last, see timings_report()
+recent_timings = deque(maxlen=100)
+
+
+class Announcement(NamedTuple):
+    """The result of posting an announcement, with how long each step took in seconds"""
+    message: discord.Message
+    thread: Optional[discord.Thread]
+    timings: Dict[str, float]
+    errors: Dict[str, BaseException]
+
+
+def timings_report() -> str:
+    """A plain text report of how long each step of the latest announcements took, per kind of announcement"""
+    steps: Dict[Tuple[str, str], List[float]] = {}
+    for name, timings in recent_timings:
+        for step, seconds in timings.items():
+            steps.setdefault((name, step), []).append(seconds)
+
+    lines = [
+        f'{name} {step}: {len(seconds)} runs, p50 {statistics.median(seconds) * 1000:.0f}ms, max {max(seconds) * 1000:.0f}ms'
+        for (name, step), seconds in sorted(steps.items())
+    ]
+
+    return '\n'.join(lines) or 'No announcements yet'
+
+
+async def run_step(name: str, func: Callable[[], Awaitable], timings: Dict[str, float], attempts: int = STEP_ATTEMPTS):
+    """Run a single REST step, retrying transient errors, and record how long it took"""
+    start = time.perf_counter()
+
+    for attempt in range(1, attempts + 1):
+        try:
+            return await func()
+        except RETRYABLE_ERRORS as e:
+            if attempt == attempts:
+                raise
+
+            logger.warning(f'Announcement step {name} failed (attempt {attempt}/{attempts}), retrying: {e}')
+            await asyncio.sleep(RETRY_DELAY * attempt)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+
+async def publish_announcement(
+    channel: discord.abc.Messageable,
+    content: str,
+    reactions: Sequence[str] = (),
+    thread_name: str = None,
+    thread_content: str = None,
+    source_message: discord.Message = None,
+    name: str = 'announcement',
+    on_sent: Callable[[discord.Message], Awaitable] = None,
+) -> Announcement:
+    """
+    Post an announcement, then run the independent follow up steps concurrently.
+
+    Reactions are added one after the other so they keep their order, alongside creating the thread (and
+    sending its first message) and deleting the source message. A failed step (or reaction) doesn't stop
+    the others, its error is logged and returned.
+
+    `on_sent` is awaited with the message as soon as it's posted, before any follow up step, e.g. to start
+    tracking its reactions before anyone can react. If it fails, its error is returned like a failed step's.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    message = await run_step('send', lambda: channel.send(content), timings)
+
+    # The post is out, so whatever happens in the callback the rest of it still gets done
+    step_errors = {}
+    if on_sent:
+        try:
+            await on_sent(message)
+        except Exception as e:
+            logger.error(f'{name} step on_sent failed: {e}', exc_info=e)
+            step_errors['on_sent'] = e
+
+    async def add_reactions():
+        # A reaction that can't be added (e.g. an unknown emoji) doesn't stop the ones after it
+        for reaction in reactions:
+            try:
+                await run_step(f'reaction {reaction}', lambda: message.add_reaction(reaction), timings)
+            except discord.HTTPException as e:
+                logger.error(f'{name} step reaction {reaction} failed: {e}')
+                step_errors[f'reaction {reaction}'] = e
+
+    async def create_thread():
+        thread = await run_step('thread', lambda: message.create_thread(name=thread_name, auto_archive_duration=1440), timings)
+
+        if thread_content:
+            await run_step('thread_message', lambda: thread.send(thread_content), timings)
+
+        return thread
+
+    async def delete_source():
+        try:
+            await run_step('delete_source', source_message.delete, timings)
+        except discord.NotFound:
+            pass
+
+    steps = {}
+    if reactions:
+        steps['reactions'] = add_reactions()
+    if thread_name:
+        steps['thread'] = create_thread()
+    if source_message:
+        steps['delete_source'] = delete_source()
+
+    results = dict(zip(steps, await asyncio.gather(*steps.values(), return_exceptions=True)))
+    timings['total'] = time.perf_counter() - start
+
+    errors = {step: result for step, result in results.items() if isinstance(result, BaseException)}
+    for step, error in errors.items():
+        logger.error(f'{name} step {step} failed: {error}', exc_info=error)
+    errors.update(step_errors)
+
+    thread = results.get('thread')
+    announcement = Announcement(message, None if isinstance(thread, BaseException) else thread, timings, errors)
+
+    recent_timings.append((name, timings))
+    logger.info(f'{name} posted in {timings["total"] * 1000:.0f}ms: ' + ', '.join(f'{step} {seconds * 1000:.0f}ms' for step, seconds in timings.items() if step != 'total'))
+
+    return announcement
@@ -0,0 +1,141 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Dict, Iterable, List, Set
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def deletes(word: str) -> Set[str]:
+    """Every way of deleting a single character from word"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class CityIndex:
+    """
+    Search index over cities for autocomplete, built once per change to the cities rather than per keystroke.
+
+    Matches are ranked exact name > name prefix > word prefix > substring > a word one typo away, then by
+    level and name. Typos are found through each word's single-deletion neighbourhood.
+    """
+
+    # Prefixes up to this long match lots of cities, so their (ordered) matches are precomputed
+    short_prefix = 3
+
+    def __init__(self, cities: Iterable = ()):
+        self.rebuild(cities)
+
+    def rebuild(self, cities: Iterable):
+        # Positions in this list are in (level, name) order, so lower positions rank higher within a tier
+        self.cities = sorted(cities, key=lambda city: (city.level, city.name.lower()))
+        self._names = [city.name.lower() for city in self.cities]
+        self._regions = [(city.region or '').lower() for city in self.cities]
+
+        self._exact: Dict[str, List[int]] = {}
+        self._short_name_prefixes: Dict[str, List[int]] = {}
+        self._short_token_prefixes: Dict[str, List[int]] = {}
+        self._deletes: Dict[str, Set[int]] = {}
+        names = []
+        tokens = []
+
+        for position, name in enumerate(self._names):
+            self._exact.setdefault(name, []).append(position)
+            names.append((name, position))
+
+            for length in range(1, min(len(name), self.short_prefix) + 1):
+                self._short_name_prefixes.setdefault(name[:length], []).append(position)
+
+            token_prefixes = set()
+            for token in TOKEN_PATTERN.findall(name):
+                tokens.append((token, position))
+                token_prefixes.update(token[:length] for length in range(1, min(len(token), self.short_prefix) + 1))
+
+                for variant in deletes(token) | {token}:
+                    self._deletes.setdefault(variant, set()).add(position)
+
+            for prefix in token_prefixes:
+                self._short_token_prefixes.setdefault(prefix, []).append(position)
+
+        self._sorted_names = sorted(names)
+        self._sorted_tokens = sorted(tokens)
+
+        # All names in one string so substring matches are found by str.find rather than a Python loop
+        self._haystack = '\n'.join(self._names)
+        self._offsets = []
+        offset = 0
+        for name in self._names:
+            self._offsets.append(offset)
+            offset += len(name) + 1
+
+    def __len__(self):
+        return len(self.cities)
+
+    def _prefixed(self, sorted_pairs, short_prefixes, prefix) -> List[int]:
+        """Positions of entries starting with prefix, in rank order"""
+        if len(prefix) <= self.short_prefix:
+            return short_prefixes.get(prefix, [])
+
+        start = bisect_left(sorted_pairs, (prefix,))
+        positions = []
+        for entry, position in islice(sorted_pairs, start, None):
+            if not entry.startswith(prefix):
+                break
+            positions.append(position)
+
+        return sorted(positions)
+
+    def _containing(self, query):
+        """Positions of names containing query, in rank order"""
+        start = self._haystack.find(query)
+        while start != -1:
+            position = bisect_right(self._offsets, start) - 1
+            yield position
+
+            # Carry on from the next name
+            start = self._haystack.find(query, self._offsets[position] + len(self._names[position]) + 1)
+
+    def regions(self) -> List[str]:
+        return sorted({city.region for city in self.cities if city.region})
+
+    def search(self, query: str, limit: int = 25, region: str = None) -> list:
+        """Best matches for query, optionally only cities in region"""
+        query = query.strip().lower()
+        region = region.strip().lower() if region else None
+
+        results = []
+        seen = set()
+
+        def take(positions) -> bool:
+            """Add positions not already matched by a better tier, returns True once we have enough"""
+            for position in positions:
+                if region and self._regions[position] != region:
+                    continue
+
+                if position not in seen:
+                    seen.add(position)
+                    results.append(position)
+
+                    if len(results) == limit:
+                        return True
+
+            return False
+
+        if not query:
+            take(range(len(self.cities)))
+            return [self.cities[position] for position in results]
+
+        # Each tier is only looked at if the better ones didn't fill the results
+        if (take(self._exact.get(query, ()))
+                or take(self._prefixed(self._sorted_names, self._short_name_prefixes, query))
+                or take(self._prefixed(self._sorted_tokens, self._short_token_prefixes, query))
+                or take(self._containing(query))):
+            return [self.cities[position] for position in results]
+
+        if len(query) >= 3 and ' ' not in query:
+            typos = set()
+            for variant in deletes(query) | {query}:
+                typos.update(self._deletes.get(variant, ()))
+            take(sorted(typos))
+
+        return [self.cities[position] for position in results]
@@ -0,0 +1,206 @@
+import os
+import json
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+from utils.config import atomic_write_json
+from utils.database import SQLiteDatabase
+from utils.spatial import parse_coords
+
+
+logger = logging.getLogger('discord.elkbot.utils.city_store')
+
+# The fields of a city record, in the order they are stored
+FIELDS = ('id', 'name', 'level', 'deep_link', 'coords', 'region')
+
+
+def validate_records(cities):
+    """Raise ValueError if cities isn't a list of valid city records"""
+    if not isinstance(cities, list):
+        raise ValueError('Cities must be a list')
+
+    ids = set()
+    for number, city in enumerate(cities, start=1):
+        if not isinstance(city, dict):
+            raise ValueError(f'City {number} must be an object')
+
+        if not isinstance(city.get('id'), str) or not city['id'] or not isinstance(city.get('name'), str) or not city['name']:
+            raise ValueError(f'City {number} must have an id and name')
+
+        if city['id'] in ids:
+            raise ValueError(f'City id {city["id"]} is used more than once')
+        ids.add(city['id'])
+
+        if not isinstance(city.get('level'), int):
+            raise ValueError(f'City {city["id"]} must have a numeric level')
+
+        unknown = set(city) - set(FIELDS)
+        if unknown:
+            raise ValueError(f'City {city["id"]} has unknown fields: {", ".join(sorted(unknown))}')
+
+        parse_coords(city.get('coords'))
+
+
+def read_cities_file(path: str) -> List[dict]:
+    """Read and validate a cities.json file"""
+    with open(path, 'r') as cities_file:
+        cities = json.load(cities_file)
+
+    validate_records(cities)
+
+    return cities
+
+
+class CityStore(ABC):
+    """Where siege cities are kept, as dicts of FIELDS keyed by city id"""
+
+    @abstractmethod
+    async def load(self) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def upsert(self, city: dict):
+        ...
+
+    @abstractmethod
+    async def remove(self, city_id: str) -> bool:
+        """Remove a city, returns False if there was no such city"""
+
+    @abstractmethod
+    async def import_records(self, cities: List[dict]):
+        """Add (or replace) many cities at once, e.g. from an old cities.json"""
+
+
+class SQLiteCityStore(CityStore):
+    """Cities in a SQLite table, every change is a single row write on the database thread"""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS cities (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            deep_link TEXT,
+            coords TEXT,
+            region TEXT
+        );
+        CREATE TABLE IF NOT EXISTS city_store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    upsert_sql = f'INSERT OR REPLACE INTO cities ({", ".join(FIELDS)}) VALUES ({", ".join("?" for _ in FIELDS)})'
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    async def load(self) -> List[dict]:
+        rows = await self.database.execute(f'SELECT {", ".join(FIELDS)} FROM cities')
+        return [dict(row) for row in rows]
+
+    async def upsert(self, city: dict):
+        await self.database.execute(self.upsert_sql, tuple(city.get(field) for field in FIELDS))
+
+    async def remove(self, city_id: str) -> bool:
+        return await self.database.run(lambda connection: connection.execute('DELETE FROM cities WHERE id = ?', (city_id,)).rowcount > 0)
+
+    async def import_records(self, cities: List[dict]):
+        await self.database.executemany(self.upsert_sql, [tuple(city.get(field) for field in FIELDS) for city in cities])
+
+    async def imported(self) -> bool:
+        """Whether the cities have been seeded from cities.json (or didn't need to be)"""
+        rows = await self.database.execute("SELECT value FROM city_store_meta WHERE key = 'imported'")
+        return bool(rows)
+
+    async def mark_imported(self, source: str):
+        await self.database.execute("INSERT OR REPLACE INTO city_store_meta (key, value) VALUES ('imported', ?)", (source,))
+
+
+class JsonCityStore(CityStore):
+    """
+    Cities in a JSON file (the original cities.json format), for when SQLite isn't wanted.
+
+    Every change still rewrites the whole file, but atomically and off the event loop, one write at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._cities: Dict[str, dict] = {}
+        self._lock = asyncio.Lock()
+
+    def _read(self) -> List[dict]:
+        try:
+            with open(self.path, 'r') as cities_file:
+                return json.load(cities_file)
+        except FileNotFoundError:
+            logger.warning(f'Cities file {self.path} not found')
+            return []
+
+    async def load(self) -> List[dict]:
+        """Read the cities, raises ValueError if the file isn't a valid list of cities"""
+        cities = await asyncio.to_thread(self._read)
+        validate_records(cities)
+
+        self._cities = {city['id']: city for city in cities}
+
+        return list(self._cities.values())
+
+    async def _save(self):
+        async with self._lock:
+            await asyncio.to_thread(atomic_write_json, self.path, list(self._cities.values()))
+
+    async def upsert(self, city: dict):
+        self._cities[city['id']] = {field: city.get(field) for field in FIELDS}
+        await self._save()
+
+    async def remove(self, city_id: str) -> bool:
+        if self._cities.pop(city_id, None) is None:
+            return False
+
+        await self._save()
+        return True
+
+    async def import_records(self, cities: List[dict]):
+        self._cities.update({city['id']: {field: city.get(field) for field in FIELDS} for city in cities})
+        await self._save()
+
+    async def apply_file(self, cities: List[dict]) -> List[dict]:
+        """Take in the cities of an edited cities.json, returns all the cities now stored"""
+        # The file is our storage, so it's already saved (and it's the whole list)
+        self._cities = {city['id']: city for city in cities}
+        return list(self._cities.values())
+
+
+async def import_json_once(store: CityStore, path: str) -> List[dict]:
+    """
+    Load the cities from the store, seeding it from a cities.json file the first time.
+
+    Once seeded that's recorded in the database, so removing every city doesn't bring cities.json back
+    on the next start. A store that already has cities (e.g. from before the record) counts as seeded.
+    """
+    cities = await store.load()
+
+    if not isinstance(store, SQLiteCityStore) or await store.imported():
+        return cities
+
+    if not cities:
+        if not os.path.exists(path):
+            return cities
+
+        try:
+            imported = await JsonCityStore(path).load()
+        except Exception:
+            logger.exception(f'Could not import cities from {path}')
+            return []
+
+        await store.import_records(imported)
+        logger.info(f'Imported {len(imported)} cities from {path}')
+
+        cities = await store.load()
+
+    await store.mark_imported(path)
+
+    return cities
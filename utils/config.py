@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+from typing import Any, Callable, Optional
+
+
+logger = logging.getLogger('discord.elkbot.utils.config')
+
+
+def strtobool(value: str) -> bool:
+    """Parse a true/false setting like distutils.util.strtobool, without importing distutils (slow, and gone in 3.12)"""
+    value = value.strip().lower()
+
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return True
+    if value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return False
+
+    raise ValueError(f'Invalid truth value {value!r}')
+
+
+def atomic_write_text(path: str, text: str):
+    """Write text to a temp file next to path, then rename it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            temp_file.write(text)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, data: Any, indent: int = 4):
+    atomic_write_text(path, json.dumps(data, indent=indent))
+
+
+class JsonConfigStore:
+    """
+    Keeps a parsed JSON config file in memory.
+
+    The file is only stat-ed at most once every `check_interval` seconds, and only re-read when its
+    mtime, inode or size have changed, so reading the config is cheap enough to do on every message.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0, validator: Optional[Callable[[Any], None]] = None):
+        self.path = path
+        self.check_interval = check_interval
+        self.validator = validator
+
+        self._data = None
+        self._signature = None
+        self._next_check = 0.0
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def read(self, path: str = None):
+        """Read and validate the config file (or another version of it), without caching it"""
+        with open(path or self.path, 'r') as config_file:
+            data = json.load(config_file)
+
+        if self.validator:
+            self.validator(data)
+
+        return data
+
+    def get(self) -> Any:
+        """Return the cached config, re-reading the file if it has changed on disk"""
+        now = time.monotonic()
+
+        if self._data is not None and now < self._next_check:
+            return self._data
+
+        self._next_check = now + self.check_interval
+        signature = self._stat_signature()
+
+        if self._data is None or signature != self._signature:
+            try:
+                self._data = self.read()
+                self._signature = signature
+            except Exception:
+                if self._data is None:
+                    raise
+
+                # Keep serving the last good config until the file is fixed
+                logger.exception(f'Could not reload config {self.path}, keeping previous version')
+                self._signature = signature
+
+        return self._data
+
+    def swap(self, data: Any):
+        """Replace the cached config with already loaded data"""
+        if self.validator:
+            self.validator(data)
+
+        self._data = data
+        self._signature = self._stat_signature()
+        self._next_check = time.monotonic() + self.check_interval
+
+    async def save(self, data: Any):
+        """Atomically write the config to disk without blocking the event loop"""
+        if self.validator:
+            self.validator(data)
+
+        await asyncio.to_thread(atomic_write_json, self.path, data)
+
+        self._data = data
+        self._signature = self._stat_signature()
+        self._next_check = time.monotonic() + self.check_interval
@@ -0,0 +1,72 @@
+import os
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List
+
+
+logger = logging.getLogger('discord.elkbot.utils.database')
+
+
+class SQLiteDatabase:
+    """
+    A SQLite connection (in WAL mode) owned by a single worker thread.
+
+    All queries are run on that thread, so they never block the event loop, and every call to
+    `run` is a single transaction.
+    """
+
+    def __init__(self, path: str, schema: str = None):
+        self.path = path
+        self.schema = schema
+
+        self._connection = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'sqlite-{os.path.basename(path)}')
+
+    def _connect(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Only ever used from our single worker thread
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        if self.schema:
+            connection.executescript(self.schema)
+
+        return connection
+
+    def _call(self, func: Callable, *args):
+        if self._connection is None:
+            self._connection = self._connect()
+
+        with self._connection:
+            return func(self._connection, *args)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Run func(connection, *args) in a transaction on the database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, *args)
+
+    def run_sync(self, func: Callable[..., Any], *args) -> Any:
+        """Blocking version of `run`, for use outside of the event loop (e.g. scripts)"""
+        return self._executor.submit(self._call, func, *args).result()
+
+    async def execute(self, sql: str, parameters: Iterable = ()) -> List[sqlite3.Row]:
+        return await self.run(lambda connection: connection.execute(sql, parameters).fetchall())
+
+    async def executemany(self, sql: str, parameters: Iterable[Iterable]):
+        return await self.run(lambda connection: connection.executemany(sql, parameters).rowcount)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def close(self):
+        """Close the connection once all queued queries have finished"""
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+logger = logging.getLogger('discord.elkbot.utils.debounce')
+
+
+class KeyedDebouncer:
+    """
+    Collects items per key and hands them to `flush` in one batch, `window` seconds after the first item.
+
+    Flushes for the same key never overlap: items arriving while a batch is being flushed start a new
+    batch, which waits for the previous flush to finish.
+    """
+
+    def __init__(self, window: float, flush: Callable[[Hashable, List[Any]], Awaitable[None]]):
+        self.window = window
+        self.flush = flush
+
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._locks: Dict[Hashable, Tuple[asyncio.Lock, int]] = {}
+        self._tasks = set()
+
+    def add(self, key: Hashable, item: Any):
+        if key in self._pending:
+            self._pending[key].append(item)
+            return
+
+        self._pending[key] = [item]
+
+        task = asyncio.create_task(self._flush_later(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self, key: Hashable):
+        await asyncio.sleep(self.window)
+
+        items = self._pending.pop(key)
+        lock, users = self._locks.get(key, (asyncio.Lock(), 0))
+        self._locks[key] = (lock, users + 1)
+
+        try:
+            async with lock:
+                await self.flush(key, items)
+        except Exception:
+            logger.exception(f'Error flushing debounced batch for {key}')
+        finally:
+            lock, users = self._locks[key]
+            if users > 1:
+                self._locks[key] = (lock, users - 1)
+            else:
+                del self._locks[key]
+
+    def cancel_all(self):
+        for task in self._tasks:
+            task.cancel()
+
+        self._pending.clear()
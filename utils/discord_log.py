@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from typing import Optional
+
+import discord
+
+
+logger = logging.getLogger('discord.elkbot.utils.discord_log')
+
+
+class DiscordLogSink:
+    """
+    Batches log lines for the bot channel into as few messages as possible.
+
+    Lines are queued without blocking the caller and flushed every `flush_interval` seconds, or as soon
+    as the next line would take the batch over Discord's message length limit. When the queue is full,
+    new lines are dropped and counted, and the count is reported in the next flush.
+
+    The channel can be given to `start` instead, lines logged before then are sent once it's known.
+    """
+
+    def __init__(self, channel: Optional[discord.abc.Messageable], flush_interval: float = 3.0, max_queue: int = 500, max_length: int = 2000):
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.max_length = max_length
+
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.sent_messages = 0
+
+        self._carry = None
+        # Lines taken off the queue for the next message but not sent yet
+        self._batch = []
+        self._task = None
+        self._started = False
+
+    def start(self, channel: Optional[discord.abc.Messageable] = None):
+        if channel is not None:
+            self.channel = channel
+        self._started = True
+
+        if not self.channel:
+            # Nowhere to send the lines queued before we knew that
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name='discord-log-sink')
+
+    def put(self, line: str, silent: bool = True) -> bool:
+        """Queue a line to be logged, returns False if it had to be dropped"""
+        if self._started and not self.channel:
+            return False
+
+        if len(line) > self.max_length:
+            line = line[:self.max_length - 3] + '...'
+
+        try:
+            self.queue.put_nowait((line, silent))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _next(self, timeout: float = None):
+        if self._carry:
+            item, self._carry = self._carry, None
+            return item
+
+        if timeout is None:
+            return await self.queue.get()
+
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    async def _collect(self):
+        """Wait for a line, then gather more until the flush interval passes or the batch is full"""
+        loop = asyncio.get_running_loop()
+
+        line, silent = await self._next()
+        self._batch = [(line, silent)]
+        length = len(line)
+
+        deadline = loop.time() + self.flush_interval
+        while (timeout := deadline - loop.time()) > 0:
+            try:
+                line, line_silent = await self._next(timeout)
+            except asyncio.TimeoutError:
+                break
+
+            if length + 1 + len(line) > self.max_length:
+                self._carry = (line, line_silent)
+                break
+
+            self._batch.append((line, line_silent))
+            length += 1 + len(line)
+            silent = silent and line_silent
+
+        return [line for line, _ in self._batch], silent
+
+    async def _send(self, lines, silent):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            note = f'_{dropped} log lines dropped_'
+
+            if sum(len(line) + 1 for line in lines) + len(note) <= self.max_length:
+                lines.append(note)
+            else:
+                logger.warning(f'{dropped} log lines dropped')
+
+        try:
+            await self.channel.send('\n'.join(lines), allowed_mentions=discord.AllowedMentions.none(), silent=silent)
+            self.sent_messages += 1
+        except discord.HTTPException as e:
+            logger.warning(f'Could not send {len(lines)} log lines to Discord bot channel: {e}')
+
+    async def _run(self):
+        while True:
+            try:
+                lines, silent = await self._collect()
+                await self._send(lines, silent)
+            except Exception:
+                # Drop the batch rather than stop logging to the bot channel for good
+                logger.exception('Could not send log lines to Discord bot channel')
+
+            self._batch = []
+
+    async def close(self):
+        """Stop the flush task and send anything still queued"""
+        if self._task is None:
+            return
+
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # The batch being collected (or sent) when it was cancelled goes first, then the rest in order
+        pending = self._batch
+        self._batch = []
+        if self._carry:
+            pending.append(self._carry)
+            self._carry = None
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+
+        lines = []
+        silent = True
+        for line, line_silent in pending:
+            if sum(len(queued) + 1 for queued in lines) + len(line) > self.max_length:
+                await self._send(lines, silent)
+                lines, silent = [], True
+
+            lines.append(line)
+            silent = silent and line_silent
+
+        if lines:
+            await self._send(lines, silent)
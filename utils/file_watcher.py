@@ -0,0 +1,116 @@
+import os
+import asyncio
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple, Union
+
+
+logger = logging.getLogger('discord.elkbot.utils.file_watcher')
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+class Watch(NamedTuple):
+    path: str
+    load: Callable[[str], Any]
+    apply: Callable[[Any], Union[Awaitable, None]]
+
+
+class FileWatcher:
+    """
+    Polls the mtime (and inode/size) of watched files, so config edited on disk is picked up without a reload.
+
+    When a file changes, `load(path)` parses and validates it in a worker thread, then `apply(data)` swaps
+    the result in on the event loop. If loading fails the last good data stays in place and `on_error`
+    is told, the file is tried again once it changes again.
+    """
+
+    def __init__(self, interval: float = 2.0, on_error: Callable[[str, Exception], None] = None):
+        self.interval = interval
+        self.on_error = on_error
+
+        self._watches: Dict[str, Watch] = {}
+        self._signatures: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, path: str, load: Callable[[str], Any], apply: Callable[[Any], Union[Awaitable, None]]):
+        """Watch path for changes from its current version, replacing any previous watch of it"""
+        path = os.path.abspath(path)
+
+        self._watches[path] = Watch(path, load, apply)
+        self._signatures[path] = file_signature(path)
+
+    def unwatch(self, path: str):
+        path = os.path.abspath(path)
+
+        self._watches.pop(path, None)
+        self._signatures.pop(path, None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.check()
+            except Exception:
+                # e.g. an on_error callback that raised, keep polling
+                logger.exception('Could not check watched files for changes')
+
+    async def check(self):
+        """Reload every watched file that has changed since it was last seen"""
+        for path, watch in list(self._watches.items()):
+            try:
+                signature = file_signature(path)
+            except OSError as e:
+                # One file we can't stat doesn't stop the others being checked
+                logger.warning(f'Could not check {path} for changes: {e}')
+                continue
+
+            if signature == self._signatures.get(path) or signature is None:
+                continue
+
+            self._signatures[path] = signature
+            await self._reload(watch)
+
+    async def _reload(self, watch: Watch):
+        try:
+            data = await asyncio.to_thread(watch.load, watch.path)
+        except Exception as e:
+            logger.warning(f'Could not reload {watch.path}, keeping the previous version: {e}')
+
+            if self.on_error:
+                self.on_error(watch.path, e)
+            return
+
+        # It may have been unwatched (e.g. its extension unloaded) while we were loading it
+        if self._watches.get(watch.path) is not watch:
+            return
+
+        try:
+            result = watch.apply(data)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.exception(f'Could not apply reloaded {watch.path}')
+
+            if self.on_error:
+                self.on_error(watch.path, e)
+            return
+
+        logger.info(f'Reloaded {watch.path}')
@@ -0,0 +1,66 @@
+import re
+from typing import Iterable, Optional, Set
+
+
+# Languages langdetect has profiles for, anything else can never match a detected language
+LANGDETECT_LANGUAGES = frozenset({
+    'af', 'ar', 'bg', 'bn', 'ca', 'cs', 'cy', 'da', 'de', 'el', 'en', 'es', 'et', 'fa', 'fi', 'fr', 'gu', 'he',
+    'hi', 'hr', 'hu', 'id', 'it', 'ja', 'kn', 'ko', 'lt', 'lv', 'mk', 'ml', 'mr', 'ne', 'nl', 'no', 'pa', 'pl',
+    'pt', 'ro', 'ru', 'sk', 'sl', 'so', 'sq', 'sv', 'sw', 'ta', 'te', 'th', 'tl', 'tr', 'uk', 'ur', 'vi',
+    'zh-cn', 'zh-tw',
+})
+
+# Words that are also common in the languages our members write (e.g. "a", "no", "me", "in", "was", "will")
+# are left out, so plain ASCII Spanish, German, French, ... isn't mistaken for English
+ENGLISH_STOP_WORDS = frozenset({
+    'about', 'after', 'all', 'and', 'any', 'are', 'at', 'be', 'because', 'been', 'but', 'by', 'can', 'could',
+    'did', 'does', 'for', 'from', 'get', 'going', 'got', 'had', 'has', 'have', 'her', 'him', 'his', 'how', "i'm",
+    'if', 'is', 'it', "it's", 'just', 'my', 'not', 'now', 'of', 'or', 'our', 'out', 'some', 'that', 'the',
+    'their', 'them', 'then', 'there', 'they', 'this', 'to', 'too', 'up', 'we', 'were', 'what', 'when', 'where',
+    'which', 'who', 'with', 'would', 'yes', 'you', 'your',
+})
+
+NOISE_PATTERN = re.compile(
+    r'https?://\S+'             # links
+    r'|<(?:@[!&]?|#)\d+>'       # user, role and channel mentions
+    r'|<a?:\w+:\d+>'            # custom emoji
+    r'|:\w+:'                   # emoji shortcodes
+)
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+MIN_LENGTH = 10
+MIN_LETTERS = 4
+ENGLISH_STOP_WORD_RATIO = 0.4
+# A couple of stop words can turn up in any language, it takes a few to call a message English
+MIN_ENGLISH_STOP_WORDS = 3
+
+
+def language_roles(role_names: Iterable[str]) -> Set[str]:
+    """Role names that are languages we could auto translate from (English never needs translating)"""
+    return {name.lower() for name in role_names} & LANGDETECT_LANGUAGES - {'en'}
+
+
+def skip_reason(text: str, roles: Set[str]) -> Optional[str]:
+    """
+    Cheap checks run before language detection.
+
+    Returns why detection can be skipped for this message, or None if it needs to be detected.
+    """
+    if not roles:
+        return 'no language roles'
+
+    if len(text) <= MIN_LENGTH:
+        return 'too short'
+
+    stripped = NOISE_PATTERN.sub(' ', text)
+    words = WORD_PATTERN.findall(stripped)
+
+    if sum(len(word) for word in words) < MIN_LETTERS:
+        return 'links/emoji only'
+
+    if stripped.isascii() and len(words) >= 3:
+        stop_words = sum(word.lower() in ENGLISH_STOP_WORDS for word in words)
+        if stop_words >= MIN_ENGLISH_STOP_WORDS and stop_words / len(words) >= ENGLISH_STOP_WORD_RATIO:
+            return 'english'
+
+    return None
@@ -0,0 +1,96 @@
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from typing import Dict
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per line, for feeding logs into other tools"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """Parse logger levels like "discord=INFO,discord.elkbot=DEBUG" """
+    levels = {}
+
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+
+        name, _, level = item.partition('=')
+        if not level or not isinstance(logging.getLevelName(level.strip().upper()), int):
+            raise ValueError(f'Invalid log level setting: {item!r}')
+
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+
+    return levels
+
+
+class PlainQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that leaves formatting to the listener's handlers.
+
+    The stock one formats the message and exception text before queueing, which would then be
+    formatted again (and lose the exception for the JSON formatter).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now, its args may not be safe to use from another thread later
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """A QueueListener that can be stopped more than once, e.g. explicitly and then at exit"""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(logger: logging.Logger, *handlers: logging.Handler, json_lines: bool = False, levels: Dict[str, int] = None) -> QueueListener:
+    """
+    Send logger's records to handlers from a background thread, so logging never does file I/O (or a
+    rotation) on the event loop. Records are queued by the logging thread and written by the listener.
+    """
+    for handler in handlers:
+        if json_lines:
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    for name, level in (levels or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(PlainQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    # Write out whatever is still queued when the bot exits
+    atexit.register(listener.stop)
+
+    return listener
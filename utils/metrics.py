@@ -0,0 +1,177 @@
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from utils.config import atomic_write_text
+
+
+logger = logging.getLogger('discord.elkbot.utils.metrics')
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class MetricSummary(NamedTuple):
+    kind: str
+    name: str
+    count: int
+    errors: int
+    p50: float
+    p95: float
+    p99: float
+
+
+class Metric:
+    """Count, error count and latency histogram of one command or event handler"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile from the histogram, interpolating within its bucket"""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index]
+
+                # Nothing to interpolate towards past the last bound
+                if upper == float('inf'):
+                    return lower
+
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+
+        return BUCKETS[-2]
+
+
+class Metrics:
+    """
+    Latency and outcome of every command and event handler, recorded by hooks on the bot.
+
+    Kept in memory as histograms, shown by /info stats and optionally exported to a Prometheus text file.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[Tuple[str, str], Metric] = {}
+        self.started = time.time()
+
+        self._export_task: Optional[asyncio.Task] = None
+
+    def observe(self, kind: str, name: str, seconds: float, error: bool = False):
+        metric = self.metrics.get((kind, name))
+        if metric is None:
+            metric = self.metrics[kind, name] = Metric()
+
+        metric.observe(seconds, error)
+
+    def count_error(self, kind: str, name: str):
+        """Count an error of something whose latency is observed separately"""
+        metric = self.metrics.get((kind, name))
+        if metric is None:
+            metric = self.metrics[kind, name] = Metric()
+
+        metric.errors += 1
+
+    @contextmanager
+    def time(self, kind: str, name: str):
+        start = time.perf_counter()
+        error = False
+
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - start, error)
+
+    def summary(self, kind: str = None) -> List[MetricSummary]:
+        """Summaries, busiest first"""
+        summaries = [
+            MetricSummary(metric_kind, name, metric.count, metric.errors, metric.quantile(0.5), metric.quantile(0.95), metric.quantile(0.99))
+            for (metric_kind, name), metric in self.metrics.items()
+            if kind is None or metric_kind == kind
+        ]
+        summaries.sort(key=lambda summary: (-summary.count, summary.kind, summary.name))
+
+        return summaries
+
+    def prometheus_text(self) -> str:
+        lines = [
+            '# HELP elkbot_handler_seconds Latency of bot commands and event handlers',
+            '# TYPE elkbot_handler_seconds histogram',
+        ]
+
+        for (kind, name), metric in sorted(self.metrics.items()):
+            labels = f'kind="{kind}",name="{name}"'
+
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, metric.buckets):
+                cumulative += bucket_count
+                lines.append(f'elkbot_handler_seconds_bucket{{{labels},le="{"+Inf" if bound == float("inf") else bound}"}} {cumulative}')
+
+            lines.append(f'elkbot_handler_seconds_sum{{{labels}}} {metric.total}')
+            lines.append(f'elkbot_handler_seconds_count{{{labels}}} {metric.count}')
+
+        lines += [
+            '# HELP elkbot_handler_errors_total Bot commands and event handlers that raised an error',
+            '# TYPE elkbot_handler_errors_total counter',
+        ]
+        for (kind, name), metric in sorted(self.metrics.items()):
+            lines.append(f'elkbot_handler_errors_total{{kind="{kind}",name="{name}"}} {metric.errors}')
+
+        lines += [
+            '# HELP elkbot_start_time_seconds When the bot started',
+            '# TYPE elkbot_start_time_seconds gauge',
+            f'elkbot_start_time_seconds {self.started}',
+        ]
+
+        return '\n'.join(lines) + '\n'
+
+    async def export(self, path: str):
+        """Atomically write the Prometheus text file, e.g. for node_exporter's textfile collector"""
+        await asyncio.to_thread(atomic_write_text, path, self.prometheus_text())
+
+    def start_exporter(self, path: str, interval: float = 60.0):
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+
+                try:
+                    await self.export(path)
+                except Exception:
+                    logger.exception(f'Could not export metrics to {path}')
+
+        if self._export_task is None:
+            self._export_task = asyncio.create_task(run())
+
+    async def stop_exporter(self, path: str = None):
+        if self._export_task:
+            self._export_task.cancel()
+            self._export_task = None
+
+            # Leave the final numbers behind, without holding up shutting down if that fails
+            if path:
+                try:
+                    await self.export(path)
+                except Exception:
+                    logger.exception(f'Could not export metrics to {path}')
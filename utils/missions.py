@@ -0,0 +1,64 @@
+import re
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+
+MISSION_CHANNEL_PATTERN = re.compile(r's(\d{2})-missions')
+MISSION_POST_PATTERN = re.compile(r'^Lvl (\d+) (.+)\n(\d{1,2}:\d{2} [apAP][mM]) (\d{2}/\d{2})')
+
+# Headers of the posts the bot makes for missions (on_message) and sieges (/siege start)
+MISSION_ANNOUNCEMENT_PATTERN = re.compile(r'^# (Lvl \d+ .+)\nAt <t:(\d+):t>')
+SIEGE_ANNOUNCEMENT_PATTERN = re.compile(r'^# (.+)\nSiege will start at <t:(\d+):F>')
+
+
+class MissionPost(NamedTuple):
+    """A mission posted by a member, e.g. "Lvl 5 Watchold\\n8:00 pm 12/04" """
+    level: int
+    content: str
+    start_time: datetime
+
+    @property
+    def title(self):
+        return f'Lvl {self.level} {self.content}'
+
+    @property
+    def unix_time(self):
+        return int(self.start_time.timestamp())
+
+
+class SiegeAnnouncement(NamedTuple):
+    """A mission or siege post made by the bot"""
+    title: str
+    unix_time: int
+
+
+def parse_mission_channel(channel_name: str) -> Optional[str]:
+    """Return the server number of a sNN-missions channel, e.g. "01" """
+    match = MISSION_CHANNEL_PATTERN.search(channel_name)
+    return match.group(1) if match else None
+
+
+def parse_mission_post(content: str, year: int = None) -> Optional[MissionPost]:
+    """
+    Parse a mission post, the date is in UTC and in the current year unless given.
+
+    Returns None when the post isn't formatted as a mission, raises ValueError when it is but its date isn't
+    a real one (e.g. 31/02).
+    """
+    match = MISSION_POST_PATTERN.match(content)
+    if not match:
+        return None
+
+    level, title, time_str, date_str = match.groups()
+    start_time = datetime.strptime(f'{date_str}/{year or datetime.now().year} {time_str}', '%d/%m/%Y %I:%M %p')
+
+    return MissionPost(int(level), title, start_time.replace(tzinfo=timezone.utc))
+
+
+def parse_siege_announcement(content: str) -> Optional[SiegeAnnouncement]:
+    """Recognise a mission or siege post made by the bot from its formatted header"""
+    match = MISSION_ANNOUNCEMENT_PATTERN.match(content) or SIEGE_ANNOUNCEMENT_PATTERN.match(content)
+    if not match:
+        return None
+
+    return SiegeAnnouncement(match.group(1), int(match.group(2)))
@@ -0,0 +1,190 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import aiohttp
+
+from utils.metrics import Metric
+
+
+# The command, event or task making REST requests, as (kind, name) like the bot's metrics. Tasks started by a
+# handler inherit it, so e.g. a debounced flush is counted against the event that scheduled it.
+current_handler: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar('current_handler', default=('background', '-'))
+
+
+class RestSummary(NamedTuple):
+    handler: str
+    route: str
+    requests: int
+    errors: int
+    rate_limited: int
+    p50: float
+    p95: float
+    bytes_sent: int
+    bytes_received: int
+
+
+class RouteStats:
+    """Requests, latency, bytes and 429s of one route, made by one handler"""
+
+    def __init__(self):
+        self.latency = Metric()
+        self.rate_limited = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @classmethod
+    def merged(cls, stats: Iterable['RouteStats']) -> 'RouteStats':
+        total = cls()
+
+        for route_stats in stats:
+            total.latency.count += route_stats.latency.count
+            total.latency.errors += route_stats.latency.errors
+            total.latency.total += route_stats.latency.total
+            total.latency.buckets = [a + b for a, b in zip(total.latency.buckets, route_stats.latency.buckets)]
+            total.rate_limited += route_stats.rate_limited
+            total.bytes_sent += route_stats.bytes_sent
+            total.bytes_received += route_stats.bytes_received
+
+        return total
+
+
+def route_template(method: str, url) -> str:
+    """The route of a request URL, like "DELETE /channels/{id}/messages/{id}" (without the API base or version)"""
+    path = url.path
+    if '/api/' in path:
+        path = path.split('/api/', 1)[1].partition('/')[2]
+
+    parts = path.strip('/').split('/')
+    for index, part in enumerate(parts):
+        if part.isdigit():
+            parts[index] = '{id}'
+        elif index and parts[index - 1] == 'reactions':
+            parts[index] = '{emoji}'
+
+    return f'{method} /{"/".join(parts)}'
+
+
+class RestStats:
+    """
+    What each command, event and background task costs in Discord REST requests.
+
+    `trace_config()` is given to the bot's HTTP client (the http_trace option), which tags every request
+    (including each retry after a 429) with `current_handler`.
+    """
+
+    def __init__(self):
+        self.stats: Dict[Tuple[Tuple[str, str], str], RouteStats] = {}
+        self.started = time.time()
+
+    @contextmanager
+    def handler(self, kind: str, name: str):
+        """Count requests made within the block (and tasks it starts) against a handler"""
+        token = current_handler.set((kind, name))
+        try:
+            yield
+        finally:
+            current_handler.reset(token)
+
+    def set_handler(self, kind: str, name: str):
+        """Count requests against a handler for the rest of the current task"""
+        current_handler.set((kind, name))
+
+    def reset(self):
+        self.stats.clear()
+        self.started = time.time()
+
+    # -----------------------
+    # aiohttp tracing
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_request_chunk_sent.append(self._on_request_chunk_sent)
+        trace.on_request_end.append(self._on_request_end)
+        trace.on_request_exception.append(self._on_request_exception)
+        trace.on_response_chunk_received.append(self._on_response_chunk_received)
+
+        return trace
+
+    def _route_stats(self, context) -> RouteStats:
+        route_stats = self.stats.get((context.handler, context.route))
+        if route_stats is None:
+            route_stats = self.stats[context.handler, context.route] = RouteStats()
+
+        return route_stats
+
+    async def _on_request_start(self, session, context, params: aiohttp.TraceRequestStartParams):
+        # Trace callbacks run in the task making the request, so this is the handler that made it
+        context.handler = current_handler.get()
+        context.route = route_template(params.method, params.url)
+        context.started = time.perf_counter()
+        context.bytes_sent = 0
+
+    async def _on_request_chunk_sent(self, session, context, params: aiohttp.TraceRequestChunkSentParams):
+        context.bytes_sent += len(params.chunk)
+
+    async def _on_request_end(self, session, context, params: aiohttp.TraceRequestEndParams):
+        route_stats = self._route_stats(context)
+        route_stats.latency.observe(time.perf_counter() - context.started, error=params.response.status >= 400 and params.response.status != 429)
+        route_stats.bytes_sent += context.bytes_sent
+
+        if params.response.status == 429:
+            route_stats.rate_limited += 1
+
+    async def _on_request_exception(self, session, context, params: aiohttp.TraceRequestExceptionParams):
+        route_stats = self._route_stats(context)
+        route_stats.latency.observe(time.perf_counter() - context.started, error=True)
+        route_stats.bytes_sent += context.bytes_sent
+
+    async def _on_response_chunk_received(self, session, context, params: aiohttp.TraceResponseChunkReceivedParams):
+        # The body is read after the request has ended
+        self._route_stats(context).bytes_received += len(params.chunk)
+
+    # -----------------------
+    # Summaries
+
+    def summary(self, by: str = None) -> List[RestSummary]:
+        """Summaries per handler and route, or totals per `by` ('handler' or 'route'), busiest first"""
+        groups: Dict[Tuple[str, str], List[RouteStats]] = {}
+        for ((kind, name), route), route_stats in self.stats.items():
+            handler = f'{kind} {name}' if name != '-' else kind
+            key = (handler if by != 'route' else '*', route if by != 'handler' else '*')
+            groups.setdefault(key, []).append(route_stats)
+
+        summaries = []
+        for (handler, route), group in groups.items():
+            total = RouteStats.merged(group)
+            summaries.append(RestSummary(
+                handler, route, total.latency.count, total.latency.errors, total.rate_limited,
+                total.latency.quantile(0.5), total.latency.quantile(0.95), total.bytes_sent, total.bytes_received,
+            ))
+        summaries.sort(key=lambda summary: (-summary.requests, summary.handler, summary.route))
+
+        return summaries
+
+    def report(self, runs: Dict[str, int] = None, limit: int = 15) -> str:
+        """
+        A plain text report of the busiest handlers and their busiest routes.
+
+        `runs` are how many times each handler has run (keyed like the summaries, e.g. "command delete"),
+        to show the requests each run costs.
+        """
+        routes = self.summary()
+        lines = []
+
+        for handler in self.summary(by='handler')[:limit]:
+            per_run = ''
+            if runs and runs.get(handler.handler):
+                per_run = f', {handler.requests / runs[handler.handler]:.1f} per run'
+
+            lines.append(
+                f'{handler.handler}: {handler.requests} requests{per_run}, {handler.rate_limited} 429s, {handler.errors} errors, '
+                f'p95 {handler.p95 * 1000:.0f}ms, {handler.bytes_sent / 1024:.1f}KiB sent, {handler.bytes_received / 1024:.1f}KiB received'
+            )
+
+            for route in [route for route in routes if route.handler == handler.handler][:5]:
+                lines.append(f'    {route.route}: {route.requests} ({route.rate_limited} 429s) p50 {route.p50 * 1000:.0f}ms')
+
+        return '\n'.join(lines) or 'No REST requests yet'
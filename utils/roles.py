@@ -0,0 +1,54 @@
+import logging
+from typing import Dict, Optional
+
+
+logger = logging.getLogger('discord.elkbot.utils.roles')
+
+
+class RoleIndex:
+    """
+    Name -> role lookup for each guild, replacing linear scans of `guild.roles`.
+
+    Each guild's index is built on first use and kept up to date from the role create/update/delete
+    events. Like `discord.utils.get`, the lowest role wins when several share a name.
+    """
+
+    def __init__(self):
+        self._guilds: Dict[int, dict] = {}
+
+    def _index(self, guild) -> dict:
+        index = self._guilds.get(guild.id)
+
+        if index is None:
+            index = {}
+            for role in guild.roles:
+                index.setdefault(role.name, role)
+
+            self._guilds[guild.id] = index
+
+        return index
+
+    def get(self, guild, name: str) -> Optional[object]:
+        return self._index(guild).get(name)
+
+    def add(self, role):
+        index = self._guilds.get(role.guild.id)
+
+        if index is not None and role.name not in index:
+            index[role.name] = role
+
+    def remove(self, role):
+        index = self._guilds.get(role.guild.id)
+
+        if index is not None and role.name in index:
+            # Another role may share the name, so let the index rebuild on next use
+            del self._guilds[role.guild.id]
+
+    def update(self, before, after):
+        # Roles are updated in place in the cache, so only a rename changes the index
+        if before.name != after.name:
+            self.remove(before)
+            self.add(after)
+
+    def forget(self, guild):
+        self._guilds.pop(guild.id, None)
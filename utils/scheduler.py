@@ -0,0 +1,169 @@
+import time
+import json
+import heapq
+import asyncio
+import logging
+from typing import Awaitable, Callable, NamedTuple
+
+from utils.database import SQLiteDatabase
+
+
+logger = logging.getLogger('discord.elkbot.utils.scheduler')
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    fire_at: float
+    payload: dict
+
+
+class PersistentScheduler:
+    """
+    Fires jobs at a given (unix) time from a heap ordered queue, with a single task sleeping until the next one.
+
+    Jobs are stored in SQLite, so jobs still pending after a restart or reload are picked up by `start`. Jobs
+    that should have fired more than `missed_grace` seconds ago are marked as missed instead of being fired.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            fire_at REAL NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+        );
+        CREATE INDEX IF NOT EXISTS scheduled_jobs_status_fire_at ON scheduled_jobs (status, fire_at);
+    """
+
+    def __init__(self, database: SQLiteDatabase, handler: Callable[[Job], Awaitable], missed_grace: float = 300):
+        self.database = database
+        self.handler = handler
+        self.missed_grace = missed_grace
+
+        self._heap = []
+        self._cancelled = set()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._heap) - len(self._cancelled)
+
+    @staticmethod
+    def _load(connection, missed_before):
+        missed = connection.execute(
+            "SELECT id, kind, fire_at, payload FROM scheduled_jobs WHERE status = 'pending' AND fire_at < ?",
+            (missed_before,),
+        ).fetchall()
+        connection.execute(
+            "UPDATE scheduled_jobs SET status = 'missed' WHERE status = 'pending' AND fire_at < ?",
+            (missed_before,),
+        )
+        pending = connection.execute(
+            "SELECT id, kind, fire_at, payload FROM scheduled_jobs WHERE status = 'pending'"
+        ).fetchall()
+
+        return missed, pending
+
+    async def start(self) -> list:
+        """Load pending jobs and start firing them, returns the jobs that were missed while we were away"""
+        missed, pending = await self.database.run(self._load, time.time() - self.missed_grace)
+
+        self._heap = [(row['fire_at'], row['id'], Job(row['id'], row['kind'], row['fire_at'], json.loads(row['payload']))) for row in pending]
+        heapq.heapify(self._heap)
+
+        missed = [Job(row['id'], row['kind'], row['fire_at'], json.loads(row['payload'])) for row in missed]
+        if missed:
+            logger.warning(f'{len(missed)} scheduled jobs were missed while the bot was not running')
+
+        logger.info(f'Scheduler started with {len(self._heap)} pending jobs')
+        self._task = asyncio.create_task(self._run(), name='scheduler')
+
+        return missed
+
+    async def stop(self):
+        """Stop firing jobs, cancelling any that are firing and waiting for them, e.g. before closing the database"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    @staticmethod
+    def _insert(connection, kind, fire_at, payload):
+        return connection.execute(
+            'INSERT INTO scheduled_jobs (kind, fire_at, payload) VALUES (?, ?, ?)',
+            (kind, fire_at, json.dumps(payload)),
+        ).lastrowid
+
+    async def schedule(self, fire_at: float, kind: str, payload: dict) -> Job:
+        job_id = await self.database.run(self._insert, kind, fire_at, payload)
+        job = Job(job_id, kind, fire_at, payload)
+
+        self._push(job)
+        return job
+
+    def _push(self, job: Job):
+        heapq.heappush(self._heap, (job.fire_at, job.id, job))
+
+        # Only wake the sleeping task if this job is now the next one due
+        if self._heap[0][1] == job.id:
+            self._wake.set()
+
+    async def cancel(self, job_id: int):
+        await self.database.execute("UPDATE scheduled_jobs SET status = 'cancelled' WHERE id = ? AND status = 'pending'", (job_id,))
+
+        if any(entry[1] == job_id for entry in self._heap):
+            self._cancelled.add(job_id)
+
+    async def _run(self):
+        while True:
+            # Drop cancelled jobs from the front of the queue
+            while self._heap and self._heap[0][1] in self._cancelled:
+                self._cancelled.discard(heapq.heappop(self._heap)[1])
+
+            self._wake.clear()
+
+            if not self._heap:
+                await self._wake.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._heap)
+
+            task = asyncio.create_task(self._fire(job), name=f'scheduler: {job.kind} {job.id}')
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, job: Job):
+        try:
+            await self.handler(job)
+            status = 'done'
+        except asyncio.CancelledError:
+            # Stopped part way, it may already have done some of its work so it mustn't fire again after a restart
+            logger.warning(f'Scheduled job {job.kind} {job.id} was interrupted')
+            await self._set_status(job, 'interrupted')
+            raise
+        except Exception:
+            logger.exception(f'Scheduled job {job.kind} {job.id} failed')
+            status = 'failed'
+
+        await self._set_status(job, status)
+
+    async def _set_status(self, job: Job, status: str):
+        try:
+            await self.database.execute('UPDATE scheduled_jobs SET status = ? WHERE id = ?', (status, job.id))
+        except Exception:
+            logger.exception(f'Could not update status of scheduled job {job.id}')
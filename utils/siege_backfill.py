@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+import discord
+
+from utils.database import SQLiteDatabase
+from utils.missions import SiegeAnnouncement, parse_siege_announcement
+from utils.siege_ledger import SiegeLedger
+
+
+logger = logging.getLogger('discord.elkbot.utils.siege_backfill')
+
+
+class BackfillProgress(NamedTuple):
+    channel_id: int
+    scanned: int
+    found: int
+    reactions: int
+    elapsed: float
+    resumed_from: Optional[int]
+    finished: bool = False
+
+    @property
+    def rate(self):
+        return self.scanned / self.elapsed if self.elapsed else 0.0
+
+
+class SiegeBackfill:
+    """
+    Fills the siege ledger from posts made before it existed, by scanning a channel's history oldest first.
+
+    Bot authored mission/siege posts are recognised by their header and their reactors collected with
+    bounded concurrency. After every page of history the last message id is checkpointed, so a scan that
+    is interrupted resumes where it stopped. A dry run reads everything but writes nothing.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            channel_id INTEGER PRIMARY KEY,
+            last_message_id INTEGER NOT NULL,
+            scanned INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    page_size = 100
+
+    def __init__(self, database: SQLiteDatabase, ledger: SiegeLedger, concurrency: int = 4):
+        self.database = database
+        self.ledger = ledger
+        self.concurrency = concurrency
+
+    async def get_checkpoint(self, channel_id: int) -> Optional[int]:
+        rows = await self.database.execute('SELECT last_message_id FROM backfill_checkpoints WHERE channel_id = ?', (channel_id,))
+        return rows[0]['last_message_id'] if rows else None
+
+    async def save_checkpoint(self, channel_id: int, last_message_id: int, scanned: int):
+        await self.database.execute(
+            'INSERT OR REPLACE INTO backfill_checkpoints (channel_id, last_message_id, scanned, updated_at) VALUES (?, ?, ?, ?)',
+            (channel_id, last_message_id, scanned, time.time()),
+        )
+
+    async def clear_checkpoint(self, channel_id: int):
+        await self.database.execute('DELETE FROM backfill_checkpoints WHERE channel_id = ?', (channel_id,))
+
+    async def _collect(self, semaphore: asyncio.Semaphore, message: discord.Message, announcement: SiegeAnnouncement, dry_run: bool) -> int:
+        participants = []
+
+        async with semaphore:
+            for reaction in message.reactions:
+                status = self.ledger.statuses.get(str(reaction.emoji))
+                if status is None:
+                    continue
+
+                async for user in reaction.users():
+                    if not user.bot:
+                        participants.append((user.id, status))
+
+        if not dry_run:
+            await self.ledger.add_siege(message.id, message.channel.id, announcement.title, announcement.unix_time)
+            await self.ledger.add_participation(message.id, participants)
+
+        return len(participants)
+
+    async def run(
+        self,
+        channel: discord.TextChannel,
+        bot_user_id: int,
+        dry_run: bool = False,
+        from_start: bool = False,
+        on_progress: Callable[[BackfillProgress], Awaitable] = None,
+    ) -> BackfillProgress:
+        """Scan a channel from its checkpoint, or from its first message if there's none or `from_start` is set"""
+        resumed_from = None if from_start else await self.get_checkpoint(channel.id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+
+        scanned = found = reactions = 0
+        collecting = []
+
+        async def finish_page(last_message_id):
+            nonlocal reactions, collecting
+
+            reactions += sum(await asyncio.gather(*collecting))
+            collecting = []
+
+            if not dry_run:
+                await self.save_checkpoint(channel.id, last_message_id, scanned)
+
+            progress = BackfillProgress(channel.id, scanned, found, reactions, time.perf_counter() - start, resumed_from)
+            if on_progress:
+                await on_progress(progress)
+
+        history = channel.history(limit=None, after=discord.Object(resumed_from) if resumed_from else None, oldest_first=True)
+
+        last_message_id = None
+        try:
+            async for message in history:
+                scanned += 1
+                last_message_id = message.id
+
+                if message.author.id == bot_user_id:
+                    announcement = parse_siege_announcement(message.content)
+                    if announcement:
+                        found += 1
+                        collecting.append(asyncio.create_task(self._collect(semaphore, message, announcement, dry_run)))
+
+                if scanned % self.page_size == 0:
+                    await finish_page(last_message_id)
+
+            if last_message_id:
+                await finish_page(last_message_id)
+        finally:
+            # Anything not checkpointed is picked up again when the backfill is resumed
+            for task in collecting:
+                task.cancel()
+
+        progress = BackfillProgress(channel.id, scanned, found, reactions, time.perf_counter() - start, resumed_from, finished=True)
+        logger.info(f'Backfill of {channel.name} {"(dry run) " if dry_run else ""}finished: {progress}')
+
+        return progress
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from utils.database import SQLiteDatabase
+
+
+logger = logging.getLogger('discord.elkbot.utils.siege_ledger')
+
+
+class SiegeLedger:
+    """
+    Who reacted to which siege post with what, kept up to date incrementally from reaction events.
+
+    Reaction changes are queued and written in batches (one transaction per batch), queries flush any
+    queued changes first so they always see them.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS sieges (
+            message_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            start_time INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS participation (
+            message_id INTEGER NOT NULL REFERENCES sieges (message_id),
+            member_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            PRIMARY KEY (message_id, member_id, status)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS participation_member_status ON participation (member_id, status);
+        CREATE INDEX IF NOT EXISTS participation_status_member ON participation (status, member_id);
+    """
+
+    statuses = {
+        "✅": 'joined',
+        "❓": 'maybe',
+        "❌": 'declined',
+    }
+
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+        self.siege_ids = set()
+
+        self._pending: List[Tuple[bool, int, int, str]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        rows = await self.database.execute('SELECT message_id FROM sieges')
+        self.siege_ids = {row['message_id'] for row in rows}
+
+        logger.info(f'Siege ledger tracking {len(self.siege_ids)} sieges')
+
+    def is_siege(self, message_id: int) -> bool:
+        return message_id in self.siege_ids
+
+    async def add_siege(self, message_id: int, channel_id: int, title: str, start_time: int = None):
+        # Track it straight away so reactions that come in while it's written aren't dropped, they're written
+        # after it as the database runs one query at a time
+        self.siege_ids.add(message_id)
+        await self.database.execute(
+            'INSERT OR IGNORE INTO sieges (message_id, channel_id, title, start_time) VALUES (?, ?, ?, ?)',
+            (message_id, channel_id, title, start_time),
+        )
+
+    async def add_participation(self, message_id: int, participants: List[Tuple[int, str]]):
+        """Record many (member id, status) reactions to a siege post at once, e.g. from a backfill"""
+        await self.database.executemany(
+            'INSERT OR IGNORE INTO participation (message_id, member_id, status) VALUES (?, ?, ?)',
+            [(message_id, member_id, status) for member_id, status in participants],
+        )
+
+    def record(self, message_id: int, member_id: int, emoji: str, added: bool) -> bool:
+        """Queue a reaction change on a siege post, returns False if it's not one we track"""
+        status = self.statuses.get(emoji)
+        if status is None or message_id not in self.siege_ids:
+            return False
+
+        self._pending.append((added, message_id, member_id, status))
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+
+        return True
+
+    @staticmethod
+    def _apply(connection, changes):
+        for added, message_id, member_id, status in changes:
+            if added:
+                connection.execute('INSERT OR IGNORE INTO participation (message_id, member_id, status) VALUES (?, ?, ?)', (message_id, member_id, status))
+            else:
+                connection.execute('DELETE FROM participation WHERE message_id = ? AND member_id = ? AND status = ?', (message_id, member_id, status))
+
+    async def _flush(self):
+        try:
+            # Let reaction events that arrived together batch up
+            await asyncio.sleep(0)
+
+            while self._pending:
+                changes, self._pending = self._pending, []
+                await self.database.run(self._apply, changes)
+        except Exception:
+            logger.exception('Could not write reactions to siege ledger')
+        finally:
+            self._flush_task = None
+
+    async def flush(self):
+        if self._flush_task:
+            await asyncio.shield(self._flush_task)
+
+    async def member_stats(self, member_id: int) -> Dict[str, int]:
+        await self.flush()
+
+        rows = await self.database.execute(
+            'SELECT status, COUNT(*) AS sieges FROM participation WHERE member_id = ? GROUP BY status',
+            (member_id,),
+        )
+        counts = {status: 0 for status in self.statuses.values()}
+        counts.update({row['status']: row['sieges'] for row in rows})
+
+        return counts
+
+    async def leaderboard(self, status: str = 'joined', limit: int = 10) -> List[Tuple[int, int]]:
+        await self.flush()
+
+        rows = await self.database.execute(
+            'SELECT member_id, COUNT(*) AS sieges FROM participation WHERE status = ? GROUP BY member_id ORDER BY sieges DESC, member_id LIMIT ?',
+            (status, limit),
+        )
+
+        return [(row['member_id'], row['sieges']) for row in rows]
@@ -0,0 +1,83 @@
+import re
+import math
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+
+COORDS_PATTERN = re.compile(r'^\s*\(?\s*(-?\d+)\s*,\s*(-?\d+)\s*\)?\s*$')
+
+Coords = Tuple[int, int]
+T = TypeVar('T')
+
+
+def parse_coords(value) -> Optional[Coords]:
+    """Parse coordinates as stored ("808,1480") or entered ("(808, 1480)"), None if there are none"""
+    if value is None or value == '':
+        return None
+
+    if isinstance(value, (list, tuple)):
+        x, y = value
+        return int(x), int(y)
+
+    match = COORDS_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f'Coordinates must be in the format `x,y`, not `{value}`')
+
+    return int(match.group(1)), int(match.group(2))
+
+
+def format_coords(coords: Optional[Coords]) -> Optional[str]:
+    return f'{coords[0]},{coords[1]}' if coords else None
+
+
+class GridIndex(Generic[T]):
+    """
+    Items bucketed by position into a grid of square cells, so only the cells overlapping a search
+    circle need checking rather than every item.
+    """
+
+    def __init__(self, items: Iterable[Tuple[Coords, T]] = (), cell_size: int = 100):
+        self.cell_size = cell_size
+        self.rebuild(items)
+
+    def rebuild(self, items: Iterable[Tuple[Coords, T]]):
+        self._cells: Dict[Coords, List[Tuple[int, int, T]]] = {}
+        self._count = 0
+
+        for (x, y), item in items:
+            self._cells.setdefault((x // self.cell_size, y // self.cell_size), []).append((x, y, item))
+            self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def within(self, coords: Coords, radius: float) -> List[Tuple[float, T]]:
+        """(distance, item) for every item within radius of coords, nearest first"""
+        x, y = coords
+        radius_squared = radius * radius
+
+        min_cell_x, max_cell_x = int((x - radius) // self.cell_size), int((x + radius) // self.cell_size)
+        min_cell_y, max_cell_y = int((y - radius) // self.cell_size), int((y + radius) // self.cell_size)
+
+        if (max_cell_x - min_cell_x + 1) * (max_cell_y - min_cell_y + 1) <= len(self._cells):
+            cells = (
+                self._cells.get((cell_x, cell_y), ())
+                for cell_x in range(min_cell_x, max_cell_x + 1)
+                for cell_y in range(min_cell_y, max_cell_y + 1)
+            )
+        else:
+            # A huge radius covers more (mostly empty) cells than we have, so check the ones we have
+            cells = (
+                cell for (cell_x, cell_y), cell in self._cells.items()
+                if min_cell_x <= cell_x <= max_cell_x and min_cell_y <= cell_y <= max_cell_y
+            )
+
+        found = []
+        for cell in cells:
+            for item_x, item_y, item in cell:
+                distance_squared = (item_x - x) ** 2 + (item_y - y) ** 2
+                if distance_squared <= radius_squared:
+                    found.append((distance_squared, item))
+
+        found.sort(key=lambda entry: entry[0])
+
+        return [(math.sqrt(distance_squared), item) for distance_squared, item in found]
@@ -0,0 +1,113 @@
+import sys
+import time
+import threading
+from typing import Awaitable, Dict, List, Tuple
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time executing the module, including everything it imports"""
+
+    def __init__(self, loader, timer: 'StartupTimer'):
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Put the real loader back, nothing else should ever see this one
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+
+        start = time.perf_counter()
+        self.timer._depth += 1
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer._depth -= 1
+            self.timer.imports[module.__name__] = time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class StartupTimer:
+    """
+    Times the bot's cold start: how long each module took to import, how long each startup step took and
+    when each milestone (e.g. ready) was reached, all from when the timer was created.
+
+    While installed in sys.meta_path it times the modules imported at the top level, each including the
+    modules it imports in turn, like the cumulative times of `python -X importtime`. Uninstall it once
+    startup is done, nothing is timed after that.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: Dict[str, float] = {}
+        self.steps: Dict[str, float] = {}
+        self.milestones: List[Tuple[str, float]] = []
+        self.notes: Dict[str, str] = {}
+
+        self._depth = 0
+        self._thread_id = threading.get_ident()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # Modules imported by a module being timed are part of its time, and imports by other threads (e.g.
+        # warming up the translation backend) aren't holding up startup
+        if self._depth or threading.get_ident() != self._thread_id:
+            return None
+
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(spec.loader, self)
+
+            return spec
+
+        return None
+
+    def mark(self, milestone: str):
+        self.milestones.append((milestone, time.perf_counter() - self.started))
+
+    def note(self, name: str, outcome: str):
+        """Record how something optional at startup went, e.g. that it was skipped"""
+        self.notes[name] = outcome
+
+    async def step(self, name: str, awaitable: Awaitable):
+        """Await a startup step, timing it"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.steps[name] = time.perf_counter() - start
+
+    def report(self, slowest: int = 10) -> str:
+        milestones = ', '.join(f'{milestone} {seconds:.2f}s' for milestone, seconds in self.milestones)
+        lines = [f'Startup: {milestones}']
+
+        if self.steps:
+            lines.append('Steps: ' + ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.steps.items()))
+
+        if self.notes:
+            lines.append('Notes: ' + ', '.join(f'{name} {outcome}' for name, outcome in self.notes.items()))
+
+        if self.imports:
+            imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+            lines.append(f'Imports ({sum(self.imports.values()):.2f}s): ' + ', '.join(f'{name} {seconds:.3f}s' for name, seconds in imports[:slowest]))
+
+        return '\n'.join(lines)
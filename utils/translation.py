@@ -0,0 +1,284 @@
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from utils.database import SQLiteDatabase
+
+
+logger = logging.getLogger('discord.elkbot.utils.translation')
+
+
+class DetectionError(Exception):
+    """The language of a text couldn't be detected, so callers don't need to import langdetect for its exception"""
+
+    def __init__(self, message: str, code: int = None):
+        super().__init__(message)
+        self.code = code
+
+
+class GoogleTranslateBackend:
+    """
+    Synchronous langdetect + googletrans backend, only ever called from worker threads.
+
+    Both libraries are imported on first use, so they stay off the bot's startup path.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @staticmethod
+    def _langdetect():
+        import langdetect
+
+        langdetect.DetectorFactory.seed = 0  # For consistent language detection
+        return langdetect
+
+    @property
+    def translator(self):
+        # googletrans keeps a HTTP client per Translator, so give each worker thread its own
+        if not hasattr(self._local, 'translator'):
+            from googletrans import Translator
+            self._local.translator = Translator()
+
+        return self._local.translator
+
+    def warm_up(self):
+        """Load the langdetect profiles, which otherwise happens on the first detection"""
+        self._langdetect().detector_factory.init_factory()
+
+    def detect(self, text: str) -> str:
+        langdetect = self._langdetect()
+
+        try:
+            return langdetect.detect(text)
+        except langdetect.LangDetectException as e:
+            raise DetectionError(str(e), e.code) from e
+
+    def translate(self, text: str, src: str, dest: str) -> str:
+        return self.translator.translate(text, src=src, dest=dest).text
+
+
+class TranslationCache:
+    """
+    Bounded LRU cache of translations, with entries expiring after `ttl` seconds.
+
+    Keys are (content hash, source language, target language). When a database path is given, entries are
+    written through to it in the background and reloaded by `load`, so they survive reloads and restarts.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS translations (
+            content_hash TEXT NOT NULL,
+            src TEXT NOT NULL,
+            dest TEXT NOT NULL,
+            result TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (content_hash, src, dest)
+        );
+        CREATE INDEX IF NOT EXISTS translations_expires_at ON translations (expires_at);
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 7 * 24 * 60 * 60, database_path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.database = SQLiteDatabase(database_path, schema=self.schema) if database_path else None
+
+        self._entries = OrderedDict()
+        self._pending_writes = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(text: str, src: str, dest: str):
+        return hashlib.sha256(text.encode()).hexdigest(), src, dest
+
+    def get(self, text: str, src: str, dest: str) -> Optional[str]:
+        key = self.key(text, src, dest)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        result, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, text: str, src: str, dest: str, result: str):
+        key = self.key(text, src, dest)
+        expires_at = time.time() + self.ttl
+
+        self._insert(key, result, expires_at)
+
+        if self.database:
+            task = asyncio.create_task(self.database.execute(
+                'INSERT OR REPLACE INTO translations (content_hash, src, dest, result, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (*key, result, expires_at),
+            ))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._write_done)
+
+    def _insert(self, key, result, expires_at):
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _write_done(self, task: asyncio.Task):
+        self._pending_writes.discard(task)
+
+        if not task.cancelled() and task.exception():
+            logger.warning(f'Could not persist translation to cache: {task.exception()}')
+
+    def _load(self, connection):
+        connection.execute('DELETE FROM translations WHERE expires_at < ?', (time.time(),))
+        # Detected languages used to be cached here too, they're kept by TranslationService now
+        connection.execute("DELETE FROM translations WHERE src = 'auto' AND dest = 'detect'")
+        rows = connection.execute(
+            'SELECT content_hash, src, dest, result, expires_at FROM translations ORDER BY expires_at DESC LIMIT ?',
+            (self.max_entries,),
+        ).fetchall()
+
+        # Also trim the table so it can't grow unbounded
+        connection.execute(
+            'DELETE FROM translations WHERE rowid NOT IN (SELECT rowid FROM translations ORDER BY expires_at DESC LIMIT ?)',
+            (self.max_entries,),
+        )
+
+        return rows
+
+    async def load(self):
+        """Load persisted entries, most recently used last"""
+        if not self.database:
+            return
+
+        try:
+            rows = await self.database.run(self._load)
+        except Exception:
+            logger.exception('Could not load persisted translation cache')
+            return
+
+        for row in reversed(rows):
+            self._insert((row['content_hash'], row['src'], row['dest']), row['result'], row['expires_at'])
+
+        logger.info(f'Loaded {len(rows)} cached translations')
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        return {
+            'entries': f'{len(self._entries)}/{self.max_entries}',
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': f'{self.hits / lookups:.1%}' if lookups else 'n/a',
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'persisted': self.database.path if self.database else 'no',
+        }
+
+    def close(self):
+        if self.database:
+            self.database.close()
+
+
+class TranslationService:
+    """
+    Runs language detection and translation on a bounded pool of worker threads.
+
+    Every call is awaited with a timeout, so a slow or hung backend never blocks the event loop,
+    and cancelling the awaiting task drops calls that have not started yet.
+
+    Detected languages are kept in a small in-memory LRU of their own, so they don't count towards the
+    translation cache's stats, push translations out of it or get written to its database.
+    """
+
+    def __init__(self, backend=None, workers: int = 2, timeout: float = 10.0, cache: TranslationCache = None, detection_cache_size: int = 1024):
+        self.backend = backend or GoogleTranslateBackend()
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = cache or TranslationCache()
+        self.detection_cache_size = detection_cache_size
+
+        self._detections = OrderedDict()
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='translation')
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, func, *args), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f'{func.__name__} timed out after {self.timeout}s')
+            raise
+
+    async def warm_up(self):
+        if not hasattr(self.backend, 'warm_up'):
+            return
+
+        start = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.backend.warm_up)
+        except Exception:
+            logger.exception('Could not warm up translation backend')
+        else:
+            logger.info(f'Translation backend warmed up in {time.perf_counter() - start:.2f}s')
+
+    def start_warm_up(self):
+        """Warm up the backend in the background, unless it's already warming up"""
+        if self._warm_up_task is None or self._warm_up_task.done():
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    async def detect(self, text: str) -> str:
+        key = hashlib.sha256(text.encode()).digest()
+
+        lang = self._detections.get(key)
+        if lang is not None:
+            self._detections.move_to_end(key)
+            return lang
+
+        lang = await self._run(self.backend.detect, text)
+
+        self._detections[key] = lang
+        if len(self._detections) > self.detection_cache_size:
+            self._detections.popitem(last=False)
+
+        return lang
+
+    async def translate(self, text: str, src: str, dest: str) -> str:
+        cached = self.cache.get(text, src, dest)
+        if cached is not None:
+            return cached
+
+        translated = await self._run(self.backend.translate, text, src, dest)
+        self.cache.put(text, src, dest, translated)
+
+        return translated
+
+    def close(self):
+        # e.g. reloaded while still warming up
+        if self._warm_up_task:
+            self._warm_up_task.cancel()
+            self._warm_up_task = None
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
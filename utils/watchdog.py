@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+logger = logging.getLogger('discord.elkbot.utils.watchdog')
+
+
+class LoopWatchdog:
+    """
+    Watches for the event loop being blocked, from a thread of its own.
+
+    Every `interval` the thread asks the loop to answer a ping. If the loop hasn't answered within
+    `threshold` something is blocking it, so the loop thread's stack and the task it's running (named by
+    `set_label`/`labelled` where the bot knows what it's doing) are logged, and passed to `on_report` at most once
+    every `report_interval`. One ping per interval is cheap enough to leave running.
+    """
+
+    def __init__(self, threshold: float = 0.5, interval: float = 0.25, report_interval: float = 60.0, on_report: Callable[[str], None] = None, stack_depth: int = 8):
+        self.threshold = threshold
+        self.interval = interval
+        self.report_interval = report_interval
+        self.on_report = on_report
+        self.stack_depth = stack_depth
+
+        self.stalls = 0
+        self.max_lag = 0.0
+
+        self._labels = weakref.WeakKeyDictionary()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = None
+        self._thread: Optional[threading.Thread] = None
+        self._answered = threading.Event()
+        self._stopping = threading.Event()
+        self._last_report = None
+        self._suppressed = 0
+
+    def set_label(self, label: str):
+        """Name what the current task is doing, for the rest of the task"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._labels[task] = label
+
+    @contextmanager
+    def labelled(self, label: str):
+        """Name what the current task is doing, for any stall reported while it does it"""
+        task = asyncio.current_task()
+        if task is None:
+            yield
+            return
+
+        previous = self._labels.get(task)
+        self._labels[task] = label
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._labels.pop(task, None)
+            else:
+                self._labels[task] = previous
+
+    def start(self):
+        """Start watching the running loop"""
+        if self._thread is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+
+        self._thread = threading.Thread(target=self._run, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+        logger.info(f'Loop watchdog started, reporting stalls over {self.threshold}s')
+
+    def stop(self):
+        self._stopping.set()
+        self._answered.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._answered.clear()
+            sent = time.monotonic()
+
+            try:
+                self._loop.call_soon_threadsafe(self._answered.set)
+            except RuntimeError:
+                # The loop has been closed
+                return
+
+            if not self._answered.wait(self.threshold):
+                self._report(self._describe())
+
+                # Wait for the loop to get going again, to say how long it was blocked for
+                self._answered.wait()
+                if self._stopping.is_set():
+                    return
+
+                lag = time.monotonic() - sent
+                logger.warning(f'Event loop was blocked for {lag:.2f}s')
+            else:
+                lag = time.monotonic() - sent
+
+            self.max_lag = max(self.max_lag, lag)
+            self._stopping.wait(self.interval)
+
+    def _describe(self) -> str:
+        self.stalls += 1
+
+        # Both of these are read from the loop thread while it's stuck
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            doing = 'a callback (no task)'
+        else:
+            doing = self._labels.get(task) or task.get_name()
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            stack = '(no stack)\n'
+        else:
+            # Only the frames of whatever the loop is running, not the loop itself
+            frames = traceback.extract_stack(frame)
+            asyncio_frames = [index for index, summary in enumerate(frames) if f'{os.sep}asyncio{os.sep}' in summary.filename]
+            if asyncio_frames and asyncio_frames[-1] + 1 < len(frames):
+                frames = frames[asyncio_frames[-1] + 1:]
+
+            stack = ''.join(traceback.format_list(frames[-self.stack_depth:]))
+
+        return f'Event loop blocked for over {self.threshold}s in {doing}:\n{stack}'
+
+    def _report(self, description: str):
+        logger.warning(description)
+
+        now = time.monotonic()
+        if not self.on_report or (self._last_report is not None and now - self._last_report < self.report_interval):
+            self._suppressed += 1
+            return
+
+        self._last_report = now
+
+        summary = description
+        if self._suppressed:
+            summary += f'({self._suppressed} earlier stalls not reported here, see the log)\n'
+            self._suppressed = 0
+
+        # Reported once the loop is free again
+        try:
+            self._loop.call_soon_threadsafe(self.on_report, summary)
+        except RuntimeError:
+            pass